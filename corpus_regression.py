@@ -0,0 +1,197 @@
+"""Regression harness: run the extractor over a corpus of historical packages.
+
+Each package is processed in a fresh worker process with validation and file
+output disabled. Per-phase wall times, peak RSS, the tracemalloc peak and the
+extracted client id are recorded and compared against a stored baseline JSON.
+
+    python corpus_regression.py <corpus_dir> [--baseline FILE] [--update-baseline]
+                                [--threshold 0.25] [--min-delta 0.05]
+                                [--report FILE] [--no-tracemalloc]
+
+Exit status is 1 when any package regresses in accuracy (different or missing
+client id) or throughput (slower than baseline by more than the threshold).
+"""
+import argparse
+import contextlib
+import io
+import json
+import multiprocessing
+import os
+import sys
+import time
+import tracemalloc
+
+try:
+    import resource
+except ImportError:          # Windows
+    resource = None
+
+from crunchyroll_extractor.planner import load_calibration
+
+PACKAGE_EXTENSIONS = ('.apk', '.apkm', '.xapk', '.apks', '.zip')
+BASELINE_FILENAME = 'baseline.json'
+
+
+def _peak_rss_kb() -> int | None:
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak // 1024 if sys.platform == 'darwin' else peak   # bytes on macOS
+
+
+def _measure_package(path: str, trace_memory: bool) -> dict:
+    """Worker: run one package and return its measurements (runs in a child process)."""
+    from main import CrunchyrollAnalyzer
+
+    # a Pool worker is daemonic and cannot start the shard pool: scan serially
+    analyzer = CrunchyrollAnalyzer(workers=1)
+    record: dict = {
+        'package': os.path.basename(path),
+        'size': os.path.getsize(path),
+    }
+
+    t0 = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        ok = analyzer.run(path, validate=False, emit=False)
+    total = time.perf_counter() - t0
+
+    result = analyzer.last_result or {}
+    record.update({
+        'ok': ok,
+        'mode': result.get('mode'),
+        'version': result.get('version_name'),
+        'client_id': result.get('client_id'),
+        'error': analyzer.last_error,
+        'timings': {k: round(v, 4) for k, v in analyzer.timings.items()},
+        'total': round(total, 4),
+        'throughput_mb_s': round(record['size'] / total / 1e6, 2) if total else None,
+        'peak_rss_kb': _peak_rss_kb(),
+        'tracemalloc_peak': None,
+    })
+
+    # Second pass under tracemalloc so its overhead does not skew the timings above.
+    if trace_memory:
+        tracemalloc.start()
+        try:
+            with contextlib.redirect_stdout(io.StringIO()):
+                analyzer.run(path, validate=False, emit=False)
+            record['tracemalloc_peak'] = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+    return record
+
+
+def collect_packages(corpus_dir: str) -> list[str]:
+    """Return the package files directly inside corpus_dir, sorted by name."""
+    return sorted(
+        os.path.join(corpus_dir, f)
+        for f in os.listdir(corpus_dir)
+        if f.lower().endswith(PACKAGE_EXTENSIONS) and os.path.isfile(os.path.join(corpus_dir, f))
+    )
+
+
+def run_corpus(paths: list[str], trace_memory: bool = True) -> dict[str, dict]:
+    """Measure every package, each in a fresh process so peak RSS is per package."""
+    results: dict[str, dict] = {}
+    with multiprocessing.Pool(processes=1, maxtasksperchild=1) as pool:
+        for path in paths:
+            name = os.path.basename(path)
+            try:
+                rec = pool.apply(_measure_package, (path, trace_memory))
+            except Exception as e:
+                rec = {'package': name, 'ok': False, 'client_id': None, 'error': str(e)}
+            results[name] = rec
+            error = rec.get('error')
+            if isinstance(error, dict):
+                error = f"{error['kind']}: {error['component']}: {error['reason']}"
+            status = rec.get('client_id') or error or 'no credentials'
+            total = f"{rec['total']:.2f}s" if 'total' in rec else '-'
+            print(f"  {name:<40} {total:>8}  {status}")
+    return results
+
+
+def compare(results: dict[str, dict], baseline: dict[str, dict],
+            threshold: float, min_delta: float) -> tuple[list[str], list[str]]:
+    """Return (regressions, warnings) of results against baseline."""
+    regressions: list[str] = []
+    warnings: list[str] = []
+    for name, base in sorted(baseline.items()):
+        cur = results.get(name)
+        if cur is None:
+            warnings.append(f"{name}: in baseline but not in corpus")
+            continue
+
+        if base.get('client_id') and cur.get('client_id') != base['client_id']:
+            regressions.append(
+                f"{name}: client id {cur.get('client_id')!r} != baseline {base['client_id']!r}")
+
+        b_total, c_total = base.get('total'), cur.get('total')
+        if b_total and c_total and c_total - b_total > min_delta and c_total > b_total * (1 + threshold):
+            regressions.append(
+                f"{name}: {c_total:.3f}s vs baseline {b_total:.3f}s (+{(c_total / b_total - 1) * 100:.0f}%)")
+
+        for key in ('peak_rss_kb', 'tracemalloc_peak'):
+            b_mem, c_mem = base.get(key), cur.get(key)
+            if b_mem and c_mem and c_mem > b_mem * (1 + threshold):
+                warnings.append(f"{name}: {key} {c_mem} vs baseline {b_mem}")
+
+    for name in sorted(set(results) - set(baseline)):
+        warnings.append(f"{name}: not in baseline")
+    return regressions, warnings
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="Extraction regression harness over a package corpus.")
+    ap.add_argument('corpus', help="directory containing APK/APKM/XAPK/APKS/ZIP packages")
+    ap.add_argument('--baseline', help=f"baseline JSON (default: <corpus>/{BASELINE_FILENAME})")
+    ap.add_argument('--update-baseline', action='store_true', help="write results as the new baseline")
+    ap.add_argument('--threshold', type=float, default=0.25, help="allowed relative slowdown (default 0.25)")
+    ap.add_argument('--min-delta', type=float, default=0.05,
+                    help="ignore slowdowns smaller than this many seconds (default 0.05)")
+    ap.add_argument('--report', help="write the full results to this JSON file")
+    ap.add_argument('--no-tracemalloc', action='store_true', help="skip the tracemalloc pass")
+    args = ap.parse_args()
+
+    baseline_path = args.baseline or os.path.join(args.corpus, BASELINE_FILENAME)
+    paths = collect_packages(args.corpus)
+    if not paths:
+        print(f"ERROR: No packages found in {args.corpus}")
+        sys.exit(1)
+
+    # calibrate in this process: the daemonic workers cannot start the pool it measures
+    load_calibration(log=print)
+    print(f"=== CORPUS REGRESSION: {len(paths)} package(s) ===")
+    results = run_corpus(paths, trace_memory=not args.no_tracemalloc)
+
+    if args.report:
+        with open(args.report, 'w', encoding='utf-8') as fh:
+            json.dump({'packages': results}, fh, indent=2)
+
+    if args.update_baseline:
+        if not any(rec.get('ok') for rec in results.values()):
+            print("\nERROR: Every package failed; baseline not written.")
+            sys.exit(1)
+        with open(baseline_path, 'w', encoding='utf-8') as fh:
+            json.dump({'packages': results}, fh, indent=2)
+        print(f"\nBaseline written: {baseline_path}")
+        return
+
+    if not os.path.exists(baseline_path):
+        print(f"\nNo baseline at {baseline_path}; run with --update-baseline first.")
+        sys.exit(1)
+    with open(baseline_path, encoding='utf-8') as fh:
+        baseline = json.load(fh).get('packages', {})
+
+    regressions, warnings = compare(results, baseline, args.threshold, args.min_delta)
+    for w in warnings:
+        print(f"  WARNING: {w}")
+    for r in regressions:
+        print(f"  REGRESSION: {r}")
+    if regressions:
+        print(f"\n=== {len(regressions)} REGRESSION(S) ===")
+        sys.exit(1)
+    print("\n=== NO REGRESSIONS ===")
+
+
+if __name__ == "__main__":
+    main()
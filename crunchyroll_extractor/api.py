@@ -0,0 +1,362 @@
+"""Library entry points: the extract() core and an asyncio wrapper around a process pool.
+
+extract() loads, parses and scans one package and returns an ExtractionResult.
+By default it prints nothing, writes no files, does not validate over the
+network and does not touch the scan history. Output is left to sinks,
+callables run on the finished result (print_result, FileSink, or your own).
+The CLI runs the same core with a verbose extractor and log=print, and adds
+validation, history, the catalog and its output files around the result.
+"""
+import asyncio
+import functools
+import io
+import multiprocessing
+import os
+import time
+from concurrent.futures import Future, ProcessPoolExecutor
+from dataclasses import asdict, dataclass, field
+from typing import BinaryIO, Callable, Iterable
+
+from .apk_reader import DexPipeline, load_package
+from .axml_parser import parse_manifest
+from .config import (
+    MOBILE_TOP_K,
+    OUTPUT_JSON_FILENAME_MOBILE,
+    OUTPUT_JSON_FILENAME_TV,
+    PACKAGE_MEMORY_BUDGET_BYTES,
+    PACKAGE_TIME_BUDGET_S,
+    PROJECT_ROOT,
+)
+from .dex_extractor import DexExtractor
+from .history import HistoryEntry
+from .limits import Budget, PackageError
+from .output import (
+    basic_auth,
+    latest_json,
+    location_class,
+    user_agent_for,
+    version_string,
+    write_json,
+    write_mobile_credentials,
+    write_tv_credentials,
+)
+
+
+_LOAD_FAILED = 'unreadable'     # error kind when the package could not be opened at all
+
+
+@dataclass
+class PreviousResult:
+    """Credentials from an earlier run, used by --compare to skip the full scan."""
+    client_id: str
+    secret_id: str
+    source_class: str | None = None     # class that loaded them, if recorded
+
+
+@dataclass
+class ExtractionResult:
+    """Outcome of one extract() call. Plain data, so it pickles across processes."""
+    package:      str
+    ok:           bool = False
+    mode:         str | None = None      # 'mobile' | 'tv' once resolved
+    version_name: str | None = None
+    version_code: str | None = None
+    client_id:    str | None = None
+    secret_id:    str | None = None
+    location:     dict | None = None     # CredentialLocation as a dict
+    candidates:   list[dict] = field(default_factory=list)
+    file_size:    str | None = None
+    source:       str | None = None      # 'compare' | 'history' | 'scan': how the pair was found
+    inflated_bytes: int = 0
+    timings:      dict[str, float] = field(default_factory=dict)
+    error:        dict | None = None     # PackageError.as_dict(), or kind 'unreadable'
+
+    @property
+    def app_version(self) -> str | None:
+        if not self.ok:
+            return None
+        return version_string(self.mode, self.version_name, self.version_code)
+
+    @property
+    def auth(self) -> str | None:
+        return basic_auth(self.client_id, self.secret_id) if self.ok else None
+
+    @property
+    def user_agent(self) -> str | None:
+        return user_agent_for(self.mode, self.app_version) if self.ok else None
+
+    def as_dict(self) -> dict:
+        return {**asdict(self), 'auth': self.auth, 'user_agent': self.user_agent, 'app_version': self.app_version}
+
+
+Sink = Callable[[ExtractionResult], None]
+
+
+def describe_error(error: dict) -> str:
+    """One-line form of result.error, as PackageError formats itself."""
+    where = f" at offset 0x{error['offset']:x}" if error.get('offset') is not None else ''
+    return f"[{error['component']}] {error['reason']}{where}"
+
+
+def _package_label(package) -> str:
+    return package if isinstance(package, str) else '<stream>'
+
+
+def _quiet(msg: str) -> None:
+    pass
+
+
+def extract(
+    package: str | bytes | BinaryIO,
+    *,
+    mode: str = 'auto',
+    top_k: int = MOBILE_TOP_K,
+    time_budget: float | None = PACKAGE_TIME_BUDGET_S,
+    memory_budget: int | None = PACKAGE_MEMORY_BUDGET_BYTES,
+    cancel=None,
+    sinks: Iterable[Sink] = (),
+    extractor: DexExtractor | None = None,
+    pipeline_depth: int = 0,
+    plan: bool = False,
+    previous: PreviousResult | None = None,
+    history: dict[str, HistoryEntry] | None = None,
+    log: Callable[[str], None] = _quiet,
+) -> ExtractionResult:
+    """Extract the credentials of one package. mode: 'auto' | 'tv' | 'mobile'.
+
+    package is a path, the package bytes or a binary file object. cancel is an
+    event-like object checked alongside the time budget. Malformed input, an
+    exceeded budget or cancellation end up in result.error rather than being
+    raised.
+
+    By default the scan runs serially in the calling thread. A caller can pass
+    its own extractor (kept open; its top_k applies), load DEX files through a
+    pipeline, let the planner pick the backend, try a previous result or the
+    recorded history locations before the full scan, and receive progress
+    messages through log.
+    """
+    result = ExtractionResult(_package_label(package))
+    own = extractor is None
+    if own:
+        extractor = DexExtractor(verbose=False, workers=1, top_k=top_k)
+    try:
+        _extract(result, package, mode=mode, budget=Budget(time_budget, memory_budget, cancel),
+                 extractor=extractor, pipeline_depth=pipeline_depth, plan=plan, previous=previous,
+                 history=history or {}, log=log)
+    except PackageError as e:
+        result.error = e.as_dict()
+    finally:
+        if own:
+            extractor.close()
+    for sink in sinks:
+        sink(result)
+    return result
+
+
+def _extract(
+    result: ExtractionResult,
+    package,
+    *,
+    mode: str,
+    budget: Budget,
+    extractor: DexExtractor,
+    pipeline_depth: int,
+    plan: bool,
+    previous: PreviousResult | None,
+    history: dict[str, HistoryEntry],
+    log: Callable[[str], None],
+) -> None:
+    if isinstance(package, (bytes, bytearray, memoryview)):
+        package = io.BytesIO(package)
+
+    log("\n=== PHASE 1: LOADING PACKAGE ===")
+    messages: list[str] = []
+
+    def log_load(msg: str) -> None:
+        messages.append(msg)
+        log(msg)
+
+    t_phase = time.perf_counter()
+    contents = load_package(package, pipeline_depth=pipeline_depth, budget=budget, log=log_load)
+    result.timings['load'] = time.perf_counter() - t_phase
+    if contents is None:
+        reason = messages[-1].split('] ', 1)[-1] if messages else 'failed to load package'
+        result.error = {'kind': _LOAD_FAILED, 'component': 'zip', 'reason': reason, 'offset': None}
+        return
+    result.file_size = contents.file_size_str
+    log(f"Loaded {contents.apk_name} ({contents.file_size_str})")
+    log(f"  DEX files : {len(contents.dex_files)}")
+
+    log("\n=== PHASE 2: PARSING MANIFEST ===")
+    t_phase = time.perf_counter()
+    manifest = parse_manifest(contents.manifest_data)
+    result.timings['manifest'] = time.perf_counter() - t_phase
+    result.version_name = manifest['versionName'] or 'unknown'
+    result.version_code = manifest['versionCode'] or '0'
+    detected_tv = manifest['is_tv']
+    log(f"  versionName : {result.version_name}")
+    log(f"  versionCode : {result.version_code}")
+    log(f"  Android TV  : {detected_tv}")
+    if mode == 'auto':
+        resolved = 'tv' if detected_tv else 'mobile'
+        log(f"  [AUTO] resolved mode → {resolved.upper()}")
+    else:
+        resolved = mode
+
+    t_phase = time.perf_counter()
+    client_id = secret_id = None
+    if previous is not None and previous.source_class:
+        if extractor.confirm_previous_credentials(
+                contents.dex_files, previous.client_id, previous.secret_id, previous.source_class, budget):
+            client_id, secret_id = previous.client_id, previous.secret_id
+            result.source = 'compare'
+    entry = history.get(resolved)
+    if client_id is None and entry is not None and (resolved == 'tv' or extractor.top_k == 1):
+        client_id, secret_id = extractor.probe_history(contents.dex_files, resolved, entry, budget)
+        if client_id is not None:
+            result.source = 'history'
+    scan_plan = None
+    if client_id is None:
+        result.source = 'scan'
+        if plan:
+            scan_plan = extractor.plan(contents.dex_sizes, contents.dex_headers)
+            t_plan = time.perf_counter()
+            if scan_plan.loading == 'eager' and isinstance(contents.dex_files, DexPipeline):
+                contents.dex_files = list(contents.dex_files)
+        if resolved == 'tv':
+            client_id, secret_id = extractor.find_tv_credentials(contents.dex_files, budget)
+        elif detected_tv:
+            # Manifest says TV but mobile was requested: rank mobile candidates and
+            # collect the TV Constants class in the same pass, falling back to TV.
+            client_id, secret_id, found = extractor.find_credentials_combined(contents.dex_files, budget)
+            if found == 'tv':
+                log("\n[Fallback] Mobile scan found nothing; manifest indicates TV. Using TV credentials.")
+                resolved = 'tv'
+        else:
+            client_id, secret_id = extractor.find_mobile_credentials(contents.dex_files, budget)
+    result.timings['scan'] = time.perf_counter() - t_phase
+    if scan_plan is not None:
+        actual = time.perf_counter() - t_plan
+        log(f"[planner] {scan_plan.describe()}: predicted {scan_plan.predicted_s:.2f}s, actual {actual:.2f}s")
+    result.inflated_bytes = contents.inflated_bytes
+
+    result.mode = resolved
+    if not (client_id and secret_id):
+        return
+    location = extractor.last_location
+    result.client_id, result.secret_id = client_id, secret_id
+    result.location = location._asdict() if location else None
+    result.candidates = [{**c._asdict(), 'location': c.location._asdict()} for c in extractor.last_candidates]
+    result.ok = True
+
+
+# ── sinks ────────────────────────────────────────────────────────────────────
+
+def print_result(result: ExtractionResult) -> None:
+    """Print a short summary of a result."""
+    print(f"=== {result.package} ===")
+    if result.error:
+        print(f"  ERROR: {describe_error(result.error)}")
+    elif not result.ok:
+        print("  Credentials not found.")
+    else:
+        print(f"  Mode        : {result.mode}")
+        print(f"  Client ID   : {result.client_id}")
+        print(f"  Secret ID   : {result.secret_id}")
+        print(f"  Basic Auth  : {result.auth}")
+        print(f"  User-Agent  : {result.user_agent}")
+        print(f"  App Version : {result.app_version}")
+        if result.location:
+            print(f"  Source      : [DEX {result.location['dex']}] {result.location['method']}")
+    print(f"  Time        : {sum(result.timings.values()):.2f}s")
+
+
+class FileSink:
+    """Write latest-*.json and the credential text file of a successful result, as the CLI does.
+
+    Credentials are not validated here, so the text file records
+    'Validation Status: SKIPPED'.
+    """
+
+    def __init__(self, directory: str = PROJECT_ROOT):
+        self.directory = directory
+
+    def __call__(self, result: ExtractionResult) -> None:
+        if not result.ok:
+            return
+        validation = {'valid': False, 'skipped': True, 'error_reason': 'Validation skipped'}
+        version = result.app_version
+        filename = OUTPUT_JSON_FILENAME_TV if result.mode == 'tv' else OUTPUT_JSON_FILENAME_MOBILE
+        write_json(os.path.join(self.directory, filename),
+                   latest_json(result.auth, result.user_agent, version, location_class(result.location)))
+        if result.mode == 'tv':
+            write_tv_credentials(self.directory, result.client_id, result.secret_id, version, validation)
+        else:
+            write_mobile_credentials(self.directory, result.client_id, result.secret_id, version,
+                                     result.file_size, validation)
+
+
+# ── asyncio ──────────────────────────────────────────────────────────────────
+
+async def _stop(job: Future, cancel) -> None:
+    """Set a job's cancel event and wait until the pool job is done, ignoring further cancellation."""
+    # Event.set() on a Manager proxy is a blocking round trip: keep it off the loop
+    stopping = asyncio.gather(asyncio.to_thread(cancel.set), asyncio.wrap_future(job), return_exceptions=True)
+    while not stopping.done():
+        try:
+            await asyncio.shield(stopping)
+        except asyncio.CancelledError:
+            pass
+
+
+class AsyncExtractor:
+    """Run extract() on a process pool from asyncio code.
+
+    max_workers bounds the processes doing CPU work; max_concurrency bounds the
+    extractions in flight (queued or running, default max_workers), and with
+    them the package bytes held for the pool: a file object is only read
+    once its job has a slot. Cancelling an awaiting task drops a queued job;
+    a running one is stopped at its next budget check (within one DEX
+    member or 256 classes, or 50 ms on a sharded scan) through a shared
+    event, and its slot is held until the worker has actually stopped.
+    Sinks run in a thread so they do not block the loop.
+    """
+
+    def __init__(self, max_workers: int | None = None, max_concurrency: int | None = None):
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self._executor = ProcessPoolExecutor(max_workers=self.max_workers)
+        self._semaphore = asyncio.Semaphore(max_concurrency or self.max_workers)
+        self._manager = multiprocessing.Manager()       # serves the per-job cancel events
+
+    async def extract(
+        self,
+        package: str | bytes | BinaryIO,
+        *,
+        sinks: Iterable[Sink] = (),
+        **options,
+    ) -> ExtractionResult:
+        """Await extract(package, **options) run in the pool, then apply the sinks."""
+        async with self._semaphore:
+            if not isinstance(package, (str, bytes, bytearray)):
+                package = await asyncio.to_thread(package.read)
+            cancel = await asyncio.to_thread(self._manager.Event)
+            job = self._executor.submit(functools.partial(extract, package, cancel=cancel, **options))
+            try:
+                result = await asyncio.wrap_future(job)
+            except asyncio.CancelledError:
+                await _stop(job, cancel)    # keep the slot until a running job has stopped
+                raise
+        for sink in sinks:
+            await asyncio.to_thread(sink, result)
+        return result
+
+    def close(self) -> None:
+        """Cancel queued jobs, wait for running ones and stop the pool."""
+        self._executor.shutdown(cancel_futures=True)
+        self._manager.shutdown()
+
+    async def __aenter__(self) -> 'AsyncExtractor':
+        return self
+
+    async def __aexit__(self, *exc) -> None:
+        await asyncio.to_thread(self.close)
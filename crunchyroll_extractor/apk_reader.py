@@ -1,16 +1,207 @@
 """Read APK/APKM/XAPK/APKS packages into memory without filesystem extraction."""
+import contextlib
 import io
 import os
+import queue
+import sys
+import tempfile
+import threading
 import zipfile
-from dataclasses import dataclass
+import zlib
+from dataclasses import dataclass, field
+from typing import BinaryIO, Callable
+
+from .config import MAX_COMPRESSION_RATIO, STREAM_SPOOL_MAX_MEMORY
+from .limits import Budget, MalformedPackageError, PackageError
+from .readahead import PackedMember, _data_offset, read_members
+
+
+_DONE = object()   # end-of-stream marker on the pipeline queue
+
+_RATIO_CHECK_MIN_SIZE = 1024 * 1024   # members smaller than this are never zip bombs
+
+_SPOOL_CHUNK = 1024 * 1024
+_DEX_HEADER_SIZE = 0x70
+
+
+def _check_member(info: zipfile.ZipInfo, budget: Budget | None) -> None:
+    """Reject an implausible member from its central-directory entry, before inflating it."""
+    if (info.file_size > _RATIO_CHECK_MIN_SIZE
+            and info.file_size > MAX_COMPRESSION_RATIO * max(info.compress_size, 1)):
+        raise MalformedPackageError(
+            'zip',
+            f"{info.filename}: declared size {info.file_size} is over {MAX_COMPRESSION_RATIO}x "
+            f"its compressed size {info.compress_size}",
+            info.header_offset,
+        )
+    if budget is not None:
+        budget.check('zip')
+        budget.charge(info.file_size, 'zip')
+
+
+def _read_member(zf: zipfile.ZipFile, name: str, budget: Budget | None) -> bytes:
+    """Inflate one member; a CRC or deflate error raises MalformedPackageError."""
+    info = zf.getinfo(name)
+    _check_member(info, budget)
+    try:
+        return zf.read(info)
+    except (zipfile.BadZipFile, zlib.error) as e:
+        raise MalformedPackageError('zip', f"{name}: {e}", info.header_offset) from None
+
+
+def _inflate(member: PackedMember, budget: Budget | None) -> bytes:
+    """Decompress a member fetched by read_members, checking its size and CRC like zipfile does."""
+    info = member.info
+    _check_member(info, budget)
+    if info.flag_bits & 0x1:
+        raise MalformedPackageError('zip', f"{info.filename}: encrypted member", info.header_offset)
+    if info.compress_type == zipfile.ZIP_STORED:
+        data = bytes(member.data)
+    elif info.compress_type == zipfile.ZIP_DEFLATED:
+        try:
+            data = zlib.decompressobj(-15).decompress(member.data, info.file_size + 1)
+        except zlib.error as e:
+            raise MalformedPackageError('zip', f"{info.filename}: {e}", info.header_offset) from None
+    else:
+        raise MalformedPackageError('zip', f"{info.filename}: unsupported compression {info.compress_type}",
+                                    info.header_offset)
+    if len(data) != info.file_size or zlib.crc32(data) != info.CRC:
+        raise MalformedPackageError('zip', f"{info.filename}: size or CRC does not match the central directory",
+                                    info.header_offset)
+    return data
+
+
+def _inflate_prefix(member: PackedMember, n: int) -> bytes:
+    """First n uncompressed bytes of a member (e.g. a DEX header), without inflating the rest."""
+    if member.info.compress_type == zipfile.ZIP_DEFLATED:
+        try:
+            return zlib.decompressobj(-15).decompress(member.data, n)
+        except zlib.error as e:
+            raise MalformedPackageError('zip', f"{member.info.filename}: {e}", member.info.header_offset) from None
+    return bytes(member.data[:n])
+
+
+def _is_dex(name: str) -> bool:
+    return name.startswith('classes') and name.endswith('.dex')
+
+
+def _sorted_dex_names(names) -> list[str]:
+    """classes.dex, classes2.dex, … in load order."""
+    return sorted(
+        (n for n in names if _is_dex(n)),
+        key=lambda x: (0 if x == 'classes.dex' else int(x[7:-4] or 1)),
+    )
+
+
+class DexPipeline:
+    """Inflate DEX members on a background thread and hand them out through a bounded queue.
+
+    Iterating starts a producer thread that decompresses the members in order
+    while the consumer scans; at most ``depth`` inflated buffers wait in the
+    queue. cancel() stops the producer early. Each iteration re-inflates from
+    the start, so the pipeline can be scanned more than once. source is the
+    APK bytes or the members fetched by read_members.
+    """
+
+    def __init__(
+        self,
+        source: bytes | dict[str, PackedMember],
+        dex_names: list[str],
+        depth: int,
+        budget: Budget | None = None,
+    ):
+        self._source = source
+        self._budget = budget
+        self._names = dex_names
+        self._depth = max(1, depth)
+        self._stop: threading.Event | None = None
+        self.bytes_inflated = 0
+
+    def __len__(self) -> int:
+        return len(self._names)
+
+    @contextlib.contextmanager
+    def _reader(self):
+        """Yield a name → inflated bytes function over the source."""
+        if isinstance(self._source, dict):
+            yield lambda name: _inflate(self._source[name], self._budget)
+            return
+        with zipfile.ZipFile(io.BytesIO(self._source)) as apk:
+            yield lambda name: _read_member(apk, name, self._budget)
+
+    def __getitem__(self, index: int) -> bytes:
+        """Inflate one DEX on the calling thread, outside the pipeline (e.g. to probe it first)."""
+        with self._reader() as read:
+            data = read(self._names[index])
+        self.bytes_inflated += len(data)
+        return data
+
+    def cancel(self) -> None:
+        """Stop the current producer; buffers not yet inflated are never read."""
+        if self._stop is not None:
+            self._stop.set()
+
+    def _produce(self, q: queue.Queue, stop: threading.Event) -> None:
+        def put(item) -> bool:
+            while not stop.is_set():
+                try:
+                    q.put(item, timeout=0.1)
+                    return True
+                except queue.Full:
+                    continue
+            return False
+
+        try:
+            with self._reader() as read:
+                for name in self._names:
+                    if stop.is_set():
+                        return
+                    data = read(name)
+                    self.bytes_inflated += len(data)
+                    if not put(data):
+                        return
+        except Exception as e:
+            put(e)
+            return
+        put(_DONE)
+
+    def __iter__(self):
+        self.cancel()
+        stop = threading.Event()
+        self._stop = stop
+        q: queue.Queue = queue.Queue(maxsize=self._depth)
+        producer = threading.Thread(target=self._produce, args=(q, stop), daemon=True)
+        producer.start()
+        try:
+            while True:
+                item = q.get()
+                if item is _DONE:
+                    return
+                if isinstance(item, Exception):
+                    raise item
+                yield item
+        finally:
+            stop.set()
+            producer.join()
 
 
 @dataclass
 class ApkContents:
     manifest_data: bytes
-    dex_files: list[bytes]          # classes.dex, classes2.dex, …
+    dex_files: list[bytes] | DexPipeline    # classes.dex, classes2.dex, …
     file_size_str: str
     apk_name: str
+    dex_sizes: list[int] = field(default_factory=list)       # uncompressed, from the central directory
+    dex_headers: list[bytes] = field(default_factory=list)   # first 0x70 bytes of each DEX
+
+    @property
+    def inflated_bytes(self) -> int:
+        """Bytes decompressed so far (manifest plus every DEX inflated)."""
+        if isinstance(self.dex_files, DexPipeline):
+            dex_bytes = self.dex_files.bytes_inflated
+        else:
+            dex_bytes = sum(len(d) for d in self.dex_files)
+        return len(self.manifest_data) + dex_bytes
 
 
 def _human_size(n: int) -> str:
@@ -21,28 +212,104 @@ def _human_size(n: int) -> str:
     return f"{n:.2f} TB"
 
 
-def _read_apk_contents(apk_bytes: bytes, apk_name: str, total_size: int) -> ApkContents | None:
-    """Parse an APK (ZIP) from in-memory bytes and extract manifest + DEX files."""
+def _read_apk_contents(
+    apk_bytes: bytes,
+    apk_name: str,
+    total_size: int,
+    pipeline_depth: int = 0,
+    budget: Budget | None = None,
+    log: Callable[[str], None] = print,
+) -> ApkContents | None:
+    """Parse an APK (ZIP) from in-memory bytes and extract manifest + DEX files.
+
+    With pipeline_depth > 0 the DEX files are not inflated here; a DexPipeline
+    inflates them on demand while the caller scans. Implausible members and
+    budget overruns raise PackageError.
+    """
     try:
         with zipfile.ZipFile(io.BytesIO(apk_bytes)) as apk:
             names = apk.namelist()
-            manifest_data = apk.read('AndroidManifest.xml')
-            dex_names = sorted(
-                (n for n in names if n.startswith('classes') and n.endswith('.dex')),
-                key=lambda x: (0 if x == 'classes.dex' else int(x[7:-4] or 1)),
-            )
+            manifest_data = _read_member(apk, 'AndroidManifest.xml', budget)
+            dex_names = _sorted_dex_names(names)
             if not dex_names:
                 return None
-            dex_files = [apk.read(n) for n in dex_names]
+            dex_sizes = [apk.getinfo(n).file_size for n in dex_names]
+            if pipeline_depth > 0:
+                dex_files = DexPipeline(apk_bytes, dex_names, pipeline_depth, budget)
+                # inflating just the header prefix is cheap and lets the caller plan the scan
+                dex_headers = []
+                for n in dex_names:
+                    with apk.open(n) as fh:
+                        dex_headers.append(fh.read(_DEX_HEADER_SIZE))
+            else:
+                dex_files = [_read_member(apk, n, budget) for n in dex_names]
+                dex_headers = [d[:_DEX_HEADER_SIZE] for d in dex_files]
         return ApkContents(
             manifest_data=manifest_data,
             dex_files=dex_files,
             file_size_str=_human_size(total_size),
             apk_name=apk_name,
+            dex_sizes=dex_sizes,
+            dex_headers=dex_headers,
         )
+    except PackageError:
+        raise
+    except Exception as e:
+        log(f"[apk_reader] Failed to read APK contents: {e}")
+        return None
+
+
+def _read_apk_ordered(
+    fh: BinaryIO,
+    apk_name: str,
+    total_size: int,
+    pipeline_depth: int,
+    budget: Budget | None,
+    log: Callable[[str], None] = print,
+    *,
+    base: int = 0,
+    size: int | None = None,
+    fd: int | None = None,
+) -> ApkContents | None:
+    """Like _read_apk_contents, but fetch only the manifest and DEX members, in file order.
+
+    The APK is the size bytes of fh at base (the whole file by default). Their
+    compressed bytes are read with a few large sequential reads (after
+    posix_fadvise readahead hints when fd is given) and inflated from memory.
+    """
+    try:
+        fetched = read_members(fh, lambda n: n == 'AndroidManifest.xml' or _is_dex(n),
+                               base=base, size=size, fd=fd, budget=budget)
+    except PackageError:
+        raise
     except Exception as e:
-        print(f"[apk_reader] Failed to read APK contents: {e}")
+        log(f"[apk_reader] Failed to read APK contents: {e}")
+        return None
+    members = fetched.members
+    log(f"[apk_reader] Fetched {len(members)} member(s) in {len(fetched.spans)} read(s), "
+        f"{_human_size(fetched.bytes_read)}{' with readahead' if fetched.readahead else ''}")
+    if 'AndroidManifest.xml' not in members:
+        log("[apk_reader] Failed to read APK contents: no AndroidManifest.xml")
+        return None
+    manifest_data = _inflate(members['AndroidManifest.xml'], budget)
+    dex_names = _sorted_dex_names(members)
+    if not dex_names:
         return None
+    dex_sizes = [members[n].info.file_size for n in dex_names]
+    if pipeline_depth > 0:
+        dex_files = DexPipeline({n: members[n] for n in dex_names}, dex_names, pipeline_depth, budget)
+        dex_headers = [_inflate_prefix(members[n], _DEX_HEADER_SIZE) for n in dex_names]
+    else:
+        dex_files = [_inflate(members[n], budget) for n in dex_names]
+        dex_headers = [d[:_DEX_HEADER_SIZE] for d in dex_files]
+    return ApkContents(
+        manifest_data=manifest_data,
+        dex_files=dex_files,
+        file_size_str=_human_size(total_size),
+        apk_name=apk_name,
+        dex_sizes=dex_sizes,
+        dex_headers=dex_headers,
+    )
 
 
 def _largest_apk_in_zip(container: zipfile.ZipFile) -> str | None:
@@ -56,10 +323,128 @@ def _largest_apk_in_zip(container: zipfile.ZipFile) -> str | None:
     return best_name
 
 
-def load_package(package_path: str) -> ApkContents | None:
-    """Load an APK/APKM/XAPK/APKS/ZIP/directory and return its contents in memory."""
+def _read_apk_file(
+    path: str, size: int, pipeline_depth: int, budget: Budget | None, log: Callable[[str], None],
+) -> ApkContents | None:
+    with open(path, 'rb') as fh:
+        return _read_apk_ordered(fh, os.path.basename(path), size, pipeline_depth, budget, log,
+                                 size=size, fd=fh.fileno())
+
+
+def _read_container(
+    source: str | BinaryIO,
+    pipeline_depth: int,
+    budget: Budget | None,
+    log: Callable[[str], None] = print,
+) -> ApkContents | None:
+    """Read base.apk (or the largest .apk) out of a container ZIP given as a path or seekable file.
+
+    An APK stored uncompressed in the container is read in place, in file
+    order; a compressed one is inflated whole first.
+    """
+    with contextlib.ExitStack() as stack:
+        fh = stack.enter_context(open(source, 'rb')) if isinstance(source, str) else source
+        try:
+            with zipfile.ZipFile(fh) as container:
+                # Try base.apk first (standard APKM layout)
+                if 'base.apk' in container.namelist():
+                    apk_name = 'base.apk'
+                else:
+                    apk_name = _largest_apk_in_zip(container)
+                if not apk_name:
+                    log("[apk_reader] No APK found inside container.")
+                    return None
+                info = container.getinfo(apk_name)
+                if info.compress_type == zipfile.ZIP_STORED:
+                    log(f"[apk_reader] Reading {apk_name} ({_human_size(info.file_size)}) in place …")
+                    return _read_apk_ordered(fh, apk_name, info.file_size, pipeline_depth, budget, log,
+                                             base=_data_offset(fh, info), size=info.file_size,
+                                             fd=fh.fileno() if isinstance(source, str) else None)
+                log(f"[apk_reader] Extracting {apk_name} ({_human_size(info.file_size)}) …")
+                apk_bytes = _read_member(container, apk_name, budget)
+        except zipfile.BadZipFile:
+            log("[apk_reader] File is not a valid ZIP/APKM/XAPK.")
+            return None
+    return _read_apk_contents(apk_bytes, apk_name, len(apk_bytes), pipeline_depth, budget, log)
+
+
+def _spool(stream: BinaryIO, budget: Budget | None) -> tempfile.SpooledTemporaryFile:
+    """Copy a stream, seekable or not, into a spooled file (memory first, then an unnamed temp file).
+
+    The caller's file object is only read forward, so its position and
+    ownership stay the caller's.
+    """
+    spool = tempfile.SpooledTemporaryFile(max_size=STREAM_SPOOL_MAX_MEMORY)
+    try:
+        while True:
+            chunk = stream.read(_SPOOL_CHUNK)
+            if not chunk:
+                break
+            if budget is not None:
+                budget.charge(len(chunk), 'zip')
+            spool.write(chunk)
+    except BaseException:
+        spool.close()
+        raise
+    spool.seek(0)
+    return spool
+
+
+def _load_stream(
+    stream: BinaryIO,
+    pipeline_depth: int,
+    budget: Budget | None,
+    log: Callable[[str], None] = print,
+) -> ApkContents | None:
+    """Load a package from a file object; the container type comes from its contents, not a name.
+
+    The stream is spooled once. A ZIP with an AndroidManifest.xml member is an
+    APK; any other ZIP is treated as a container of APKs. Either way the
+    members are read straight from the spool, so a large package spilled to
+    disk is never copied back into memory whole.
+    """
+    name = os.path.basename(str(getattr(stream, 'name', '<stream>')))
+    log(f"[apk_reader] Spooling package from {name} …")
+    with _spool(stream, budget) as spool:
+        size = spool.seek(0, os.SEEK_END)
+        spool.seek(0)
+        try:
+            with zipfile.ZipFile(spool) as zf:
+                is_apk = 'AndroidManifest.xml' in zf.namelist()
+        except zipfile.BadZipFile:
+            log("[apk_reader] Input is not a valid ZIP/APK.")
+            return None
+
+        if is_apk:
+            log(f"[apk_reader] Reading APK: {name} ({_human_size(size)})")
+            return _read_apk_ordered(spool, name, size, pipeline_depth, budget, log, size=size)
+        log(f"[apk_reader] Reading container: {name} ({_human_size(size)})")
+        return _read_container(spool, pipeline_depth, budget, log)
+
+
+def load_package(
+    package: str | BinaryIO,
+    *,
+    pipeline_depth: int = 0,
+    budget: Budget | None = None,
+    log: Callable[[str], None] = print,
+) -> ApkContents | None:
+    """Load an APK/APKM/XAPK/APKS/ZIP/directory and return its contents in memory.
+
+    package is a filesystem path, '-' for stdin, or a binary file object (e.g. a
+    pipe); streams are spooled and their type detected from magic bytes.
+    pipeline_depth > 0 returns the DEX files as a DexPipeline of that queue depth.
+    budget bounds the bytes loaded; structural problems raise PackageError.
+    Progress messages go to log (print by default).
+    """
+    if package == '-':
+        package = sys.stdin.buffer
+    if not isinstance(package, (str, os.PathLike)):
+        return _load_stream(package, pipeline_depth, budget, log)
+    package_path = os.fspath(package)
+
     if not os.path.exists(package_path):
-        print(f"[apk_reader] Path not found: {package_path}")
+        log(f"[apk_reader] Path not found: {package_path}")
         return None
 
     # ── directory of APKs ────────────────────────────────────────────────────
@@ -75,43 +460,24 @@ def load_package(package_path: str) -> ApkContents | None:
                         best_size = sz
                         best_path = fp
         if not best_path:
-            print("[apk_reader] No APK found in directory.")
+            log("[apk_reader] No APK found in directory.")
             return None
-        print(f"[apk_reader] Using largest APK in directory: {os.path.basename(best_path)}")
-        with open(best_path, 'rb') as fh:
-            data = fh.read()
-        return _read_apk_contents(data, os.path.basename(best_path), best_size)
+        log(f"[apk_reader] Using largest APK in directory: {os.path.basename(best_path)}")
+        return _read_apk_file(best_path, best_size, pipeline_depth, budget, log)
 
     total_size = os.path.getsize(package_path)
     ext = os.path.splitext(package_path)[1].lower()
 
     # ── single APK ───────────────────────────────────────────────────────────
     if ext == '.apk':
-        print(f"[apk_reader] Reading APK: {os.path.basename(package_path)}")
-        with open(package_path, 'rb') as fh:
-            data = fh.read()
-        return _read_apk_contents(data, os.path.basename(package_path), total_size)
+        log(f"[apk_reader] Reading APK: {os.path.basename(package_path)}")
+        return _read_apk_file(package_path, total_size, pipeline_depth, budget, log)
 
     # ── container (APKM / XAPK / APKS / ZIP-of-APKs) ────────────────────────
     if ext in ('.apkm', '.xapk', '.apks', '.zip') or zipfile.is_zipfile(package_path):
         ext_upper = ext.upper() or '.ZIP'
-        print(f"[apk_reader] Reading {ext_upper} container: {os.path.basename(package_path)}")
-        try:
-            with zipfile.ZipFile(package_path) as container:
-                # Try base.apk first (standard APKM layout)
-                if 'base.apk' in container.namelist():
-                    apk_name = 'base.apk'
-                else:
-                    apk_name = _largest_apk_in_zip(container)
-                if not apk_name:
-                    print("[apk_reader] No APK found inside container.")
-                    return None
-                print(f"[apk_reader] Extracting {apk_name} ({_human_size(container.getinfo(apk_name).file_size)}) …")
-                apk_bytes = container.read(apk_name)
-        except zipfile.BadZipFile:
-            print("[apk_reader] File is not a valid ZIP/APKM/XAPK.")
-            return None
-        return _read_apk_contents(apk_bytes, apk_name, len(apk_bytes))
+        log(f"[apk_reader] Reading {ext_upper} container: {os.path.basename(package_path)}")
+        return _read_container(package_path, pipeline_depth, budget, log)
 
-    print(f"[apk_reader] Unsupported file type: {ext}")
+    log(f"[apk_reader] Unsupported file type: {ext}")
     return None
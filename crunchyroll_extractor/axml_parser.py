@@ -1,9 +1,17 @@
 """Parse Android Binary XML (AXML) without external tools."""
 import struct
 
+from .limits import MalformedPackageError
+
+
+_STRING_POOL_HEADER_SIZE = 28
+
 
 def _read_string_pool(data: bytes, chunk_start: int) -> list[str]:
+    if chunk_start + _STRING_POOL_HEADER_SIZE > len(data):
+        raise MalformedPackageError('manifest', "string pool header is truncated", chunk_start)
     hdr_size   = struct.unpack_from('<H', data, chunk_start + 2)[0]
+    chunk_size = struct.unpack_from('<I', data, chunk_start + 4)[0]
     string_count = struct.unpack_from('<I', data, chunk_start + 8)[0]
     flags      = struct.unpack_from('<I', data, chunk_start + 16)[0]
     strings_start = struct.unpack_from('<I', data, chunk_start + 20)[0]
@@ -11,6 +19,10 @@ def _read_string_pool(data: bytes, chunk_start: int) -> list[str]:
 
     offsets_base = chunk_start + hdr_size
     sdata_base   = chunk_start + strings_start
+    chunk_end    = chunk_start + chunk_size
+    if chunk_end > len(data) or offsets_base + string_count * 4 > chunk_end or sdata_base > chunk_end:
+        raise MalformedPackageError(
+            'manifest', f"string pool ({string_count} strings) does not fit its chunk", chunk_start)
 
     strings: list[str] = []
     for i in range(string_count):
@@ -40,7 +52,17 @@ _TYPE_STRING       = 0x03
 
 
 def parse_manifest(axml_data: bytes) -> dict:
-    """Parse a binary AndroidManifest.xml. Returns versionName, versionCode, is_tv."""
+    """Parse a binary AndroidManifest.xml. Returns versionName, versionCode, is_tv.
+
+    Truncated or corrupt input raises MalformedPackageError.
+    """
+    try:
+        return _parse_manifest(axml_data)
+    except (IndexError, struct.error) as e:
+        raise MalformedPackageError('manifest', f"truncated or corrupt manifest ({e})") from e
+
+
+def _parse_manifest(axml_data: bytes) -> dict:
     result = {'versionName': None, 'versionCode': None, 'is_tv': False}
     if len(axml_data) < 8:
         return result
@@ -57,6 +79,8 @@ def parse_manifest(axml_data: bytes) -> dict:
         chunk_size = struct.unpack_from('<I', axml_data, pos + 4)[0]
         if chunk_size <= 0:
             break
+        if chunk_size < 8:
+            raise MalformedPackageError('manifest', f"chunk size {chunk_size} is smaller than its header", pos)
         if chunk_type == _CHUNK_STRING_POOL:
             strings = _read_string_pool(axml_data, pos)
         pos += chunk_size
@@ -74,10 +98,10 @@ def parse_manifest(axml_data: bytes) -> dict:
         chunk_type = struct.unpack_from('<H', axml_data, pos)[0]
         chunk_hdr  = struct.unpack_from('<H', axml_data, pos + 2)[0]
         chunk_size = struct.unpack_from('<I', axml_data, pos + 4)[0]
-        if chunk_size <= 0:
+        if chunk_size < 8:
             break
 
-        if chunk_type == _CHUNK_START_ELEM:
+        if chunk_type == _CHUNK_START_ELEM and pos + 30 <= len(axml_data):
             name_idx = struct.unpack_from('<I', axml_data, pos + 20)[0]
             elem_name = strings[name_idx] if name_idx < len(strings) else ''
             if elem_name == 'manifest':
@@ -95,7 +119,7 @@ def parse_manifest(axml_data: bytes) -> dict:
                     attr_name = strings[name_idx] if name_idx < len(strings) else ''
 
                     if attr_name == 'versionName':
-                        if val_type == _TYPE_STRING and val_data < len(strings):
+                        if val_type == _TYPE_STRING and 0 <= val_data < len(strings):
                             result['versionName'] = strings[val_data]
                         elif raw_idx != 0xFFFFFFFF and raw_idx < len(strings):
                             result['versionName'] = strings[raw_idx]
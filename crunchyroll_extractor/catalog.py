@@ -0,0 +1,104 @@
+"""SQLite catalog of processed package versions and their extracted credentials."""
+import hashlib
+import json
+import os
+import sqlite3
+import time
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    id             INTEGER PRIMARY KEY,
+    recorded_at    REAL    NOT NULL,
+    package        TEXT    NOT NULL,
+    package_sha256 TEXT,
+    mode           TEXT    NOT NULL,
+    version_name   TEXT,
+    version_code   TEXT,
+    app_version    TEXT,
+    client_id      TEXT    NOT NULL,
+    secret_id      TEXT    NOT NULL,
+    auth           TEXT    NOT NULL,
+    user_agent     TEXT,
+    source_class   TEXT,
+    valid          INTEGER,             -- NULL when validation was skipped
+    timings        TEXT                 -- JSON {phase: seconds}
+);
+CREATE INDEX IF NOT EXISTS runs_version     ON runs (version_name, version_code);
+CREATE INDEX IF NOT EXISTS runs_credentials ON runs (client_id, secret_id);
+CREATE INDEX IF NOT EXISTS runs_mode_latest ON runs (mode, recorded_at);
+"""
+
+_COLUMNS = (
+    'recorded_at', 'package', 'package_sha256', 'mode', 'version_name', 'version_code', 'app_version',
+    'client_id', 'secret_id', 'auth', 'user_agent', 'source_class', 'valid', 'timings',
+)
+
+
+def package_sha256(path: str) -> str | None:
+    """SHA-256 of a package file, or None for directories and streams."""
+    if not isinstance(path, str) or not os.path.isfile(path):
+        return None
+    digest = hashlib.sha256()
+    with open(path, 'rb') as fh:
+        for chunk in iter(lambda: fh.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class Catalog:
+    """Append-only record of runs. Inserts are buffered and written in one transaction.
+
+    record() flushes automatically every batch_size runs; call flush() (or
+    close()) at the end of a batch.
+    """
+
+    def __init__(self, path: str, batch_size: int = 50):
+        self.path = path
+        self.batch_size = max(1, batch_size)
+        self._pending: list[tuple] = []
+        self._db = sqlite3.connect(path)
+        self._db.executescript(_SCHEMA)
+
+    def record(self, **run) -> None:
+        """Queue one run; keys are the runs columns (recorded_at defaults to now)."""
+        run.setdefault('recorded_at', time.time())
+        if isinstance(run.get('timings'), dict):
+            run['timings'] = json.dumps({k: round(v, 6) for k, v in run['timings'].items()})
+        if isinstance(run.get('valid'), bool):
+            run['valid'] = int(run['valid'])
+        self._pending.append(tuple(run.get(c) for c in _COLUMNS))
+        if len(self._pending) >= self.batch_size:
+            self.flush()
+
+    def flush(self) -> int:
+        """Write the queued runs in a single transaction; returns how many were written."""
+        if not self._pending:
+            return 0
+        rows, self._pending = self._pending, []
+        placeholders = ', '.join('?' for _ in _COLUMNS)
+        with self._db:
+            self._db.executemany(f"INSERT INTO runs ({', '.join(_COLUMNS)}) VALUES ({placeholders})", rows)
+        return len(rows)
+
+    def close(self) -> None:
+        self.flush()
+        self._db.close()
+
+    # ── queries ──────────────────────────────────────────────────────────────
+
+    def latest(self, mode: str) -> dict | None:
+        """Return the most recently recorded run of a mode as a column dict."""
+        cur = self._db.cursor()
+        cur.row_factory = sqlite3.Row
+        row = cur.execute(
+            "SELECT * FROM runs WHERE mode = ? ORDER BY recorded_at DESC, id DESC LIMIT 1", (mode,),
+        ).fetchone()
+        return dict(row) if row is not None else None
+
+    def versions_with_credentials(self, client_id: str, secret_id: str) -> list[tuple[str, str, str]]:
+        """Return distinct (mode, version_name, version_code) that shipped these credentials."""
+        return self._db.execute(
+            "SELECT DISTINCT mode, version_name, version_code FROM runs"
+            " WHERE client_id = ? AND secret_id = ? ORDER BY version_name, version_code",
+            (client_id, secret_id),
+        ).fetchall()
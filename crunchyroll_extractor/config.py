@@ -3,6 +3,8 @@ import os
 # Base paths
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 PROJECT_ROOT = os.path.dirname(BASE_DIR)
+CACHE_DIR = os.path.join(PROJECT_ROOT, ".cache")
+INDEX_CACHE_DIR = os.path.join(CACHE_DIR, "dex-index")
 OUTPUT_JSON_FILENAME_TV = "latest-tv.json"
 OUTPUT_JSON_FILENAME_MOBILE = "latest-mobile.json"
 
@@ -22,4 +24,62 @@ TARGET_PATTERNS: list[str] = [
     "CR-AndroidMobile-CSAI-Prod-SVOD",
     "app-config-default-production.json",
     "6B9FA461",
-]
\ No newline at end of file
+]
+
+# Mobile scan scope: class descriptor prefixes. A class is walked only if it
+# matches an include prefix (any class when the list is empty) and no exclude
+# prefix. Third-party libraries never hold the credentials.
+SCAN_INCLUDE_PREFIXES: list[str] = []
+SCAN_EXCLUDE_PREFIXES: list[str] = [
+    "Landroid/",
+    "Landroidx/",
+    "Lcom/google/",
+    "Lcom/squareup/",
+    "Lio/reactivex/",
+    "Lj$/",
+    "Lkotlin/",
+    "Lkotlinx/",
+    "Lokhttp3/",
+    "Lokio/",
+    "Lretrofit2/",
+]
+
+# DEX loading: number of inflated DEX buffers queued ahead of the scanner
+# (0 = inflate every DEX up front before scanning)
+DEX_PIPELINE_DEPTH = 2
+
+# APK reads: the manifest and DEX members are fetched in file order; members
+# separated by at most this many bytes of other members share one read (a
+# short detour costs less than a seek on a cold or network disk).
+READAHEAD_MAX_GAP = 1024 ** 2
+
+# DEX scanning: worker processes for the mobile scan (1 = serial, 0 = let the
+# planner choose from the package shape, the CPU count and its calibration). A
+# DEX with at least SHARD_MIN_CLASS_DEFS class_defs is split into one class
+# range per worker.
+SCAN_WORKERS = 0
+SHARD_MIN_CLASS_DEFS = 2000
+PLANNER_CALIBRATION_FILE = os.path.join(CACHE_DIR, "planner-calibration.json")
+
+# Scan history (opt-in with --history): where each mode's validated credentials
+# were found by the last full scan. A --history run walks that class of that
+# DEX first and skips the full scan if the candidate is confirmed there.
+SCAN_HISTORY_FILE = os.path.join(CACHE_DIR, "scan-history.json")
+
+# Mobile ranking: number of best (hits, distance) candidates kept across all
+# DEX files and reported with their location (1 = the winner only).
+MOBILE_TOP_K = 1
+
+# Per-package limits: wall-time budget, bytes read/inflated into memory, and the
+# largest plausible deflate ratio for a single ZIP member (zip-bomb guard).
+PACKAGE_TIME_BUDGET_S = 300
+PACKAGE_MEMORY_BUDGET_BYTES = 2 * 1024 ** 3
+MAX_COMPRESSION_RATIO = 200
+
+# Packages read from stdin or a file object are spooled in memory up to this
+# size, then to an anonymous temporary file.
+STREAM_SPOOL_MAX_MEMORY = 128 * 1024 ** 2
+
+# Optional SQLite catalog (--catalog): runs are inserted in transactions of
+# this many rows during a batch.
+CATALOG_BATCH_SIZE = 50
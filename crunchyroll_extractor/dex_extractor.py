@@ -1,10 +1,28 @@
 """Extract Crunchyroll credentials from DEX files without decompilation."""
+import array
+import bisect
+import heapq
 import re
 import struct
+import sys
 import time
-from typing import NamedTuple
+from concurrent.futures import FIRST_EXCEPTION, ProcessPoolExecutor, wait
+from multiprocessing import shared_memory
+from typing import Iterable, NamedTuple
 
-from .config import TARGET_PATTERNS, TV_CONSTANTS_CLASS
+from .config import (
+    TARGET_PATTERNS,
+    TV_CONSTANTS_CLASS,
+    SCAN_WORKERS,
+    SHARD_MIN_CLASS_DEFS,
+    MOBILE_TOP_K,
+    SCAN_INCLUDE_PREFIXES,
+    SCAN_EXCLUDE_PREFIXES,
+)
+from .history import HistoryEntry
+from .limits import Budget, MalformedPackageError
+from .metrics import Metrics
+from .planner import ScanPlan, available_cpus, can_start_workers, dex_shape, load_calibration, plan_scan
 
 
 # ─────────────────────────── credential regexes ─────────────────────────────
@@ -21,6 +39,19 @@ _OP_CONST_STRING_JUMBO = 0x1B   # 6-byte: opcode(1) reg(1) string_idx(4)
 
 # ─────────────────────────── low-level DEX helpers ──────────────────────────
 
+_ULEB128_MAX_SHIFT = 28     # uleb128 values in DEX are at most 5 bytes (32 bits)
+
+# Header table descriptors: (name, count offset, table offset, entry size)
+_HEADER_TABLES = (
+    ('string_ids', 0x38, 0x3C, 4),
+    ('type_ids',   0x40, 0x44, 4),
+    ('proto_ids',  0x48, 0x4C, 12),
+    ('field_ids',  0x50, 0x54, 8),
+    ('method_ids', 0x58, 0x5C, 8),
+    ('class_defs', 0x60, 0x64, 32),
+)
+
+
 def _read_uleb128(data: bytes, pos: int) -> tuple[int, int]:
     result = 0; shift = 0
     while True:
@@ -29,6 +60,20 @@ def _read_uleb128(data: bytes, pos: int) -> tuple[int, int]:
         if not (b & 0x80):
             return result, pos
         shift += 7
+        if shift > _ULEB128_MAX_SHIFT:
+            raise MalformedPackageError('dex', "uleb128 longer than 5 bytes", pos)
+
+
+def _validate_header(dex: bytes) -> None:
+    """Check that every header table lies inside the buffer (raises MalformedPackageError)."""
+    size = len(dex)
+    if size < 0x70:
+        raise MalformedPackageError('dex', f"file of {size} bytes is shorter than the DEX header")
+    for name, count_off, table_off, entry in _HEADER_TABLES:
+        count = struct.unpack_from('<I', dex, count_off)[0]
+        off = struct.unpack_from('<I', dex, table_off)[0]
+        if count and (off < 0x70 or off + count * entry > size):
+            raise MalformedPackageError('dex', f"{name} table ({count} entries) runs past end of file", off)
 
 
 def _extract_strings(dex: bytes) -> list[str]:
@@ -41,13 +86,18 @@ def _extract_strings(dex: bytes) -> list[str]:
     for i in range(n_str):
         off = struct.unpack_from('<I', dex, off_str + i * 4)[0]
         pos = off
-        result = 0; shift = 0
+        utf16_len = 0; shift = 0
         while True:
             b = dex[pos]; pos += 1
-            result |= (b & 0x7F) << shift
+            utf16_len |= (b & 0x7F) << shift
             if not (b & 0x80): break
             shift += 7
-        end = dex.index(b'\x00', pos)
+            if shift > _ULEB128_MAX_SHIFT:
+                raise MalformedPackageError('dex', "uleb128 longer than 5 bytes", pos)
+        # MUTF-8 needs at most 3 bytes per UTF-16 unit: bound the terminator search
+        end = dex.find(b'\x00', pos, pos + 3 * utf16_len + 1)
+        if end < 0:
+            raise MalformedPackageError('dex', f"unterminated string_data_item #{i}", off)
         try:
             strings.append(dex[pos:end].decode('utf-8', 'replace'))
         except Exception:
@@ -55,15 +105,163 @@ def _extract_strings(dex: bytes) -> list[str]:
     return strings
 
 
-def _extract_types(dex: bytes, strings: list[str]) -> list[str]:
-    """Parse the DEX type descriptor pool."""
-    n = struct.unpack_from('<I', dex, 0x40)[0]
-    off = struct.unpack_from('<I', dex, 0x44)[0]
-    types: list[str] = []
-    for i in range(n):
-        sid = struct.unpack_from('<I', dex, off + i * 4)[0]
-        types.append(strings[sid] if sid < len(strings) else '')
-    return types
+def _u32_table(dex: bytes, off: int, n: int) -> array.array:
+    """Copy a little-endian u32 table into an array (a single C-level copy, no per-entry decode)."""
+    table = array.array('I')
+    table.frombytes(dex[off: off + 4 * n])
+    if sys.byteorder == 'big':
+        table.byteswap()
+    return table
+
+
+class _StringIds:
+    """Lazy view over string_ids: a string is decoded only when indexed.
+
+    The pool is sorted, so find() locates a string in O(log n) decodes.
+    """
+    __slots__ = ('_dex', '_offs')
+
+    def __init__(self, dex: bytes):
+        n = struct.unpack_from('<I', dex, 0x38)[0]
+        off = struct.unpack_from('<I', dex, 0x3C)[0]
+        self._dex = dex
+        self._offs = _u32_table(dex, off, n)
+
+    def __len__(self) -> int:
+        return len(self._offs)
+
+    def __getitem__(self, sid: int) -> str:
+        utf16_len, pos = _read_uleb128(self._dex, self._offs[sid])
+        end = self._dex.find(b'\x00', pos, pos + 3 * utf16_len + 1)
+        if end < 0:
+            raise MalformedPackageError('dex', f"unterminated string_data_item #{sid}", self._offs[sid])
+        return self._dex[pos:end].decode('utf-8', 'replace')
+
+    def find(self, value: str) -> int:
+        """Return the string id of an exact value, or -1 if it is not in the pool."""
+        i = bisect.bisect_left(self, value)
+        return i if i < len(self) and self[i] == value else -1
+
+
+class _TypeIds:
+    """Lazy view over type_ids: a descriptor is looked up only when indexed.
+
+    Entries are sorted by string id, and so by descriptor, which lets find()
+    binary-search instead of materialising every descriptor.
+    """
+    __slots__ = ('_sids', '_strings')
+
+    def __init__(self, dex: bytes, strings: list[str] | _StringIds):
+        n = struct.unpack_from('<I', dex, 0x40)[0]
+        off = struct.unpack_from('<I', dex, 0x44)[0]
+        self._sids = _u32_table(dex, off, n)
+        self._strings = strings
+
+    def __len__(self) -> int:
+        return len(self._sids)
+
+    def __getitem__(self, type_idx: int) -> str:
+        if not 0 <= type_idx < len(self._sids):
+            return '?'
+        sid = self._sids[type_idx]
+        return self._strings[sid] if sid < len(self._strings) else '?'
+
+    def find(self, descriptor: str) -> int:
+        """Return the type_idx of an exact descriptor, or -1 if the DEX does not define it."""
+        i = bisect.bisect_left(self, descriptor)
+        return i if i < len(self) and self[i] == descriptor else -1
+
+
+class _RecordTable:
+    """Lazy view over a fixed-size header table, decoding one entry per lookup."""
+    __slots__ = ('_dex', '_off', '_n', '_types', '_strings')
+    _ENTRY: struct.Struct
+    _COUNT_OFF: int
+
+    def __init__(self, dex: bytes, types: _TypeIds, strings: list[str]):
+        self._dex = dex
+        self._n = struct.unpack_from('<I', dex, self._COUNT_OFF)[0]
+        self._off = struct.unpack_from('<I', dex, self._COUNT_OFF + 4)[0]
+        self._types = types
+        self._strings = strings
+
+    def __len__(self) -> int:
+        return self._n
+
+    def _entry(self, idx: int) -> tuple | None:
+        if not 0 <= idx < self._n:
+            return None
+        return self._ENTRY.unpack_from(self._dex, self._off + idx * self._ENTRY.size)
+
+    def _string(self, sid: int) -> str:
+        return self._strings[sid] if sid < len(self._strings) else '?'
+
+
+class _ProtoIds(_RecordTable):
+    """proto_ids: shorty_idx u32, return_type_idx u32, parameters_off u32."""
+    __slots__ = ()
+    _ENTRY = struct.Struct('<III')
+    _COUNT_OFF = 0x48
+
+    def descriptor(self, proto_idx: int) -> str:
+        """Return '(params)return', e.g. '(Ljava/lang/String;I)V'."""
+        entry = self._entry(proto_idx)
+        if entry is None:
+            return '(?)?'
+        _shorty, ret_idx, params_off = entry
+        params = ''
+        if params_off:
+            n = struct.unpack_from('<I', self._dex, params_off)[0]
+            if params_off + 4 + 2 * n > len(self._dex):
+                return '(?)?'
+            idxs = struct.unpack_from(f'<{n}H', self._dex, params_off + 4)
+            params = ''.join(self._types[t] for t in idxs)
+        return f"({params}){self._types[ret_idx]}"
+
+
+class _FieldIds(_RecordTable):
+    """field_ids: class_idx u16, type_idx u16, name_idx u32."""
+    __slots__ = ()
+    _ENTRY = struct.Struct('<HHI')
+    _COUNT_OFF = 0x50
+
+    def format(self, field_idx: int) -> str:
+        """Return 'Lcls;->name:Ltype;'."""
+        entry = self._entry(field_idx)
+        if entry is None:
+            return '?'
+        cls_idx, type_idx, name_idx = entry
+        return f"{self._types[cls_idx]}->{self._string(name_idx)}:{self._types[type_idx]}"
+
+
+class _MethodIds(_RecordTable):
+    """method_ids: class_idx u16, proto_idx u16, name_idx u32."""
+    __slots__ = ('_protos',)
+    _ENTRY = struct.Struct('<HHI')
+    _COUNT_OFF = 0x58
+
+    def __init__(self, dex: bytes, types: _TypeIds, strings: list[str]):
+        super().__init__(dex, types, strings)
+        self._protos = _ProtoIds(dex, types, strings)
+
+    def name(self, method_idx: int) -> str:
+        entry = self._entry(method_idx)
+        return '?' if entry is None else self._string(entry[2])
+
+    def signature(self, method_idx: int) -> str:
+        """Return 'name(params)return'."""
+        entry = self._entry(method_idx)
+        if entry is None:
+            return '?'
+        _cls, proto_idx, name_idx = entry
+        return self._string(name_idx) + self._protos.descriptor(proto_idx)
+
+    def format(self, method_idx: int) -> str:
+        """Return 'Lcls;->name(params)return'."""
+        entry = self._entry(method_idx)
+        if entry is None:
+            return '?'
+        return f"{self._types[entry[0]]}->{self.signature(method_idx)}"
 
 
 class _StringRef(NamedTuple):
@@ -94,50 +292,806 @@ def _scan_code_item(insns: bytes, n_strings: int) -> list[_StringRef]:
     return refs
 
 
-def _iter_class_methods(dex: bytes, strings: list[str], types: list[str]):
-    """Yield (class_descriptor, access_flags, const_string_refs) for every method in the DEX."""
-    n_cls  = struct.unpack_from('<I', dex, 0x60)[0]
+class _ScanStats:
+    """Work counters filled in by _iter_code_refs (flushed once per class)."""
+    __slots__ = ('methods', 'code_bytes', 'classes', 'scoped', 'classes_skipped', 'code_bytes_skipped',
+                 'methods_pruned')
+
+    def __init__(self) -> None:
+        self.methods = 0
+        self.code_bytes = 0
+        self.classes = 0                # class_defs in the DEX
+        self.scoped = False             # the mobile scope mask was applied
+        self.classes_skipped = 0        # not walked (scope mask, or all but Constants on a TV-only scan)
+        self.code_bytes_skipped = 0     # estimate, see _estimate_skipped_code
+        self.methods_pruned = 0         # too short to beat the ranking, not decoded
+
+    def add(self, other: '_ScanStats') -> None:
+        self.methods += other.methods
+        self.code_bytes += other.code_bytes
+        self.classes_skipped += other.classes_skipped
+        self.methods_pruned += other.methods_pruned
+
+
+class _HitFloor:
+    """Fewest const-string refs a method needs to matter; raised by the caller as the ranking fills.
+
+    Methods of keep_type_idx (the TV Constants class) are always decoded.
+    """
+    __slots__ = ('hits', 'keep_type_idx')
+
+    def __init__(self, hits: int, keep_type_idx: int = -1) -> None:
+        self.hits = hits
+        self.keep_type_idx = keep_type_idx
+
+
+def _iter_code_refs(
+    dex: bytes,
+    n_strings: int,
+    stats: _ScanStats | None = None,
+    start: int = 0,
+    stop: int | None = None,
+    budget: Budget | None = None,
+    skip: bytes | bytearray | None = None,
+    floor: _HitFloor | None = None,
+):
+    """Yield (type_idx, method_idx, access_flags, code_off, const_string_refs) for class_defs[start:stop].
+
+    Works on any buffer supporting indexing, slicing and struct.unpack_from
+    (bytes or a memoryview over shared memory). Member counts and code items
+    are bounds-checked against the header so corrupt input fails fast.
+    Classes whose type_idx is flagged in skip are passed over without
+    decoding their class_data_item. With a floor, a method whose instructions
+    cannot hold floor.hits const-strings (2 code units each) is not decoded.
+    """
+    size    = len(dex)
+    n_fld   = struct.unpack_from('<I', dex, 0x50)[0]
+    n_mth   = struct.unpack_from('<I', dex, 0x58)[0]
+    n_cls   = struct.unpack_from('<I', dex, 0x60)[0]
     off_cls = struct.unpack_from('<I', dex, 0x64)[0]
-    n_str  = len(strings)
+    stop = n_cls if stop is None else min(stop, n_cls)
 
-    for i in range(n_cls):
+    for i in range(start, stop):
+        if budget is not None and not i & 0xFF:
+            budget.check('dex')
         cd_off = off_cls + i * 32
         type_idx     = struct.unpack_from('<I', dex, cd_off)[0]
+        if skip is not None and skip[type_idx]:
+            if stats is not None:
+                stats.classes_skipped += 1
+            continue
         class_data_off = struct.unpack_from('<I', dex, cd_off + 24)[0]
         if not class_data_off:
             continue
-        class_name = types[type_idx] if type_idx < len(types) else '?'
 
         pos = class_data_off
         sf, pos  = _read_uleb128(dex, pos)
         iif, pos = _read_uleb128(dex, pos)
         dm, pos  = _read_uleb128(dex, pos)
         vm, pos  = _read_uleb128(dex, pos)
+        if sf + iif > n_fld or dm + vm > n_mth:
+            raise MalformedPackageError('dex', f"class_data_item of class_def #{i} has impossible member counts",
+                                        class_data_off)
 
         for _ in range(sf + iif):       # skip fields
             _, pos = _read_uleb128(dex, pos)
             _, pos = _read_uleb128(dex, pos)
 
-        for _ in range(dm + vm):
-            _, pos   = _read_uleb128(dex, pos)    # method_idx_diff
+        n_code = 0
+        code_units = 0
+        n_pruned = 0
+        method_idx = 0
+        for m in range(dm + vm):
+            if m == dm:
+                method_idx = 0                    # virtual_methods restart the diff encoding
+            diff, pos = _read_uleb128(dex, pos)   # method_idx_diff
+            method_idx += diff
             acc, pos = _read_uleb128(dex, pos)    # access_flags
             code_off, pos = _read_uleb128(dex, pos)
             if not code_off:
                 continue
             insns_size = struct.unpack_from('<I', dex, code_off + 12)[0]
-            insns = dex[code_off + 16: code_off + 16 + insns_size * 2]
-            refs = _scan_code_item(insns, n_str)
+            insns_end = code_off + 16 + insns_size * 2
+            if insns_end > size:
+                raise MalformedPackageError('dex', "code_item runs past end of file", code_off)
+            if floor is not None and insns_size // 2 < floor.hits and type_idx != floor.keep_type_idx:
+                n_pruned += 1
+                continue
+            n_code += 1
+            code_units += insns_size
+            insns = dex[code_off + 16: insns_end]
+            refs = _scan_code_item(insns, n_strings)
             if refs:
-                yield class_name, acc, refs
+                yield type_idx, method_idx, acc, code_off, refs
+        if stats is not None:
+            stats.methods += n_code
+            stats.code_bytes += code_units * 2
+            stats.methods_pruned += n_pruned
+
+
+# ─────────────────────────── class scope ────────────────────────────────────
+
+_SCOPE_INCLUDE = tuple(p.encode() for p in SCAN_INCLUDE_PREFIXES)
+_SCOPE_EXCLUDE = tuple(p.encode() for p in SCAN_EXCLUDE_PREFIXES)
+
+# map_list item types
+_TYPE_CODE_ITEM        = 0x2001
+_TYPE_STRING_DATA_ITEM = 0x2002
+
+
+class _DescriptorPrefixes:
+    """Sequence of the first `width` raw MUTF-8 bytes of each type descriptor, in type_idx order.
+
+    A descriptor shorter than width is followed by its NUL terminator, which
+    sorts before every prefix byte, so the sequence stays sorted.
+    """
+    __slots__ = ('_dex', '_str_offs', '_type_sids', '_width')
+
+    def __init__(self, dex: bytes, str_offs: array.array, type_sids: array.array, width: int):
+        self._dex = dex
+        self._str_offs = str_offs
+        self._type_sids = type_sids
+        self._width = width
+
+    def __len__(self) -> int:
+        return len(self._type_sids)
+
+    def __getitem__(self, type_idx: int) -> bytes:
+        _, pos = _read_uleb128(self._dex, self._str_offs[self._type_sids[type_idx]])
+        return self._dex[pos: pos + self._width]
+
+
+def _scope_mask(
+    dex: bytes,
+    include: tuple[bytes, ...] = _SCOPE_INCLUDE,
+    exclude: tuple[bytes, ...] = _SCOPE_EXCLUDE,
+) -> bytearray | None:
+    """Return per-type_idx skip flags (1 = do not walk the class), or None if nothing is filtered.
+
+    type_ids are sorted by descriptor, so every prefix selects a contiguous
+    type_idx range, found by binary search on raw string bytes without
+    decoding a single descriptor.
+    """
+    if not include and not exclude:
+        return None
+    n_types = struct.unpack_from('<I', dex, 0x40)[0]
+    str_offs = _u32_table(dex, struct.unpack_from('<I', dex, 0x3C)[0], struct.unpack_from('<I', dex, 0x38)[0])
+    type_sids = _u32_table(dex, struct.unpack_from('<I', dex, 0x44)[0], n_types)
+
+    def prefix_range(prefix: bytes) -> tuple[int, int]:
+        view = _DescriptorPrefixes(dex, str_offs, type_sids, len(prefix))
+        lo = bisect.bisect_left(view, prefix)
+        return lo, bisect.bisect_right(view, prefix, lo)
+
+    mask = bytearray(b'\x01' * n_types) if include else bytearray(n_types)
+    for prefix in include:
+        lo, hi = prefix_range(prefix)
+        mask[lo:hi] = bytes(hi - lo)
+    for prefix in exclude:
+        lo, hi = prefix_range(prefix)
+        mask[lo:hi] = b'\x01' * (hi - lo)
+    return mask
+
+
+def _class_data_spans(dex: bytes) -> list[int]:
+    """Bytes from each class_def's class_data_item to the next one (0 without class data).
+
+    A cheap proxy for a class's code size, read from the class_def table only.
+    """
+    n_cls   = struct.unpack_from('<I', dex, 0x60)[0]
+    off_cls = struct.unpack_from('<I', dex, 0x64)[0]
+    data_offs = [struct.unpack_from('<I', dex, off_cls + i * 32 + 24)[0] for i in range(n_cls)]
+    ordered = sorted(o for o in data_offs if o)
+    span = {o: nxt - o for o, nxt in zip(ordered, ordered[1:] + [len(dex)])}
+    return [span.get(o, 0) if o else 0 for o in data_offs]
+
+
+def _section_span(dex: bytes, item_type: int) -> tuple[int, int] | None:
+    """(start, end) of a data section according to the map_list, or None if absent.
+
+    The end is the next section's offset (or the end of the file).
+    """
+    map_off = struct.unpack_from('<I', dex, 0x34)[0]
+    if not map_off or map_off + 4 > len(dex):
+        return None
+    n = struct.unpack_from('<I', dex, map_off)[0]
+    if map_off + 4 + n * 12 > len(dex):
+        return None
+    items = [struct.unpack_from('<HHII', dex, map_off + 4 + i * 12) for i in range(n)]
+    start = [off for typ, _, _, off in items if typ == item_type]
+    if not start or start[0] > len(dex):
+        return None
+    after = [off for *_, off in items if off > start[0]]
+    return start[0], min(after, default=len(dex))
+
+
+def _code_section_size(dex: bytes) -> int:
+    """Size of the code_item section according to the map_list (0 if absent)."""
+    span = _section_span(dex, _TYPE_CODE_ITEM)
+    return span[1] - span[0] if span else 0
+
+
+def _estimate_skipped_code(dex: bytes, mask: bytes | bytearray) -> int:
+    """Estimate the code bytes a scope mask saves: the code section weighted by class_data spans."""
+    off_cls = struct.unpack_from('<I', dex, 0x64)[0]
+    spans = _class_data_spans(dex)
+    total = sum(spans)
+    if not total:
+        return 0
+    skipped = sum(w for i, w in enumerate(spans)
+                  if mask[struct.unpack_from('<I', dex, off_cls + i * 32)[0]])
+    return _code_section_size(dex) * skipped // total
+
+
+# ─────────────────────────── raw pre-screen ─────────────────────────────────
+
+# ASCII, so these bytes are also the MUTF-8 encoding stored in string_data_items
+_PRESCREEN_TARGETS = tuple(p.encode() for p in TARGET_PATTERNS)
+_PRESCREEN_TV = TV_CONSTANTS_CLASS.encode()
+
+
+def _prescreen(dex: bytes, *, mobile: bool, tv: bool) -> tuple[bool, bool]:
+    """Return which of (mobile, tv) can still match, from a raw byte search of the string data.
+
+    A decoded string containing a target pattern (or the Constants descriptor)
+    holds the same bytes, so a miss rules the strategy out before any table is
+    parsed. Only the string_data section is searched when the map_list has one.
+    """
+    if dex[:4] != b'dex\n' or len(dex) < 0x70:
+        return False, False
+    lo, hi = _section_span(dex, _TYPE_STRING_DATA_ITEM) or (0, len(dex))
+    if mobile:
+        mobile = any(dex.find(p, lo, hi) >= 0 for p in _PRESCREEN_TARGETS)
+    if tv:
+        tv = dex.find(_PRESCREEN_TV, lo, hi) >= 0
+    return mobile, tv
+
+
+# ─────────────────────────── intra-DEX sharding ─────────────────────────────
+
+def _plan_shards(dex: bytes, n_shards: int, skip: bytes | bytearray | None = None) -> list[tuple[int, int]]:
+    """Split class_defs into contiguous index ranges of roughly equal code size.
+
+    Classes are weighted by their class_data span; classes flagged in skip
+    count as empty.
+    """
+    n_cls   = struct.unpack_from('<I', dex, 0x60)[0]
+    off_cls = struct.unpack_from('<I', dex, 0x64)[0]
+    if n_cls == 0:
+        return []
+    n_shards = max(1, min(n_shards, n_cls))
+
+    weights = [1 + w for w in _class_data_spans(dex)]
+    if skip is not None:
+        for i in range(n_cls):
+            if skip[struct.unpack_from('<I', dex, off_cls + i * 32)[0]]:
+                weights[i] = 1
+
+    total = sum(weights)
+    shards: list[tuple[int, int]] = []
+    start = 0
+    acc = 0
+    for i, w in enumerate(weights):
+        acc += w
+        if acc * n_shards >= total * (len(shards) + 1) and len(shards) < n_shards - 1:
+            shards.append((start, i + 1))
+            start = i + 1
+    shards.append((start, n_cls))
+    return [s for s in shards if s[0] < s[1]]
+
+
+# how often the parent checks the budget and cancel event while shards run
+_SHARD_POLL_S = 0.05
+
+
+def _scan_shard(
+    shm_name: str,
+    start: int,
+    stop: int,
+    n_strings: int,
+    target_ids: frozenset[int],
+    keep_type_idx: int,
+    skip: bytes | None,
+    min_hits: int = 2,
+) -> tuple[list[tuple[int, int, int, int, list[_StringRef]]], _ScanStats]:
+    """Worker: scan class_defs[start:stop] of a DEX held in shared memory.
+
+    Only methods that can matter to the caller are returned: those with at least
+    min_hits target-pattern refs, and every method of class keep_type_idx.
+    """
+    shm = shared_memory.SharedMemory(name=shm_name)
+    try:
+        stats = _ScanStats()
+        floor = _HitFloor(min_hits, keep_type_idx)
+        kept = [
+            item
+            for item in _iter_code_refs(shm.buf, n_strings, stats, start, stop, skip=skip, floor=floor)
+            if item[0] == keep_type_idx or sum(1 for r in item[4] if r.string_id in target_ids) >= min_hits
+        ]
+        return kept, stats
+    finally:
+        shm.close()
+
+
+def _iter_code_refs_sharded(
+    dex: bytes,
+    n_strings: int,
+    target_ids: set[int],
+    keep_type_idx: int,
+    pool: ProcessPoolExecutor,
+    n_shards: int,
+    stats: _ScanStats,
+    skip: bytes | bytearray | None = None,
+    min_hits: int = 2,
+    budget: Budget | None = None,
+):
+    """Like _iter_code_refs, but fan class_def shards out to a process pool.
+
+    Yields only the methods _scan_shard keeps, in class_def order, so the merged
+    ranking is identical to a serial walk. The budget is checked while the
+    shards run; once it trips, queued shards are cancelled and running ones
+    abandoned.
+    """
+    shm = shared_memory.SharedMemory(create=True, size=len(dex))
+    try:
+        shm.buf[:len(dex)] = dex
+        frozen_skip = bytes(skip) if skip is not None else None
+        futures = [
+            pool.submit(_scan_shard, shm.name, a, b, n_strings, frozenset(target_ids), keep_type_idx,
+                        frozen_skip, min_hits)
+            for a, b in _plan_shards(dex, n_shards, skip)
+        ]
+        pending = set(futures)
+        while pending:
+            done, pending = wait(pending, timeout=_SHARD_POLL_S, return_when=FIRST_EXCEPTION)
+            try:
+                for f in done:
+                    f.result()          # re-raise a failed shard
+                if budget is not None:
+                    budget.check('dex')
+            except BaseException:
+                for f in pending:
+                    f.cancel()
+                raise
+        results = [f.result() for f in futures]
+    finally:
+        shm.close()
+        shm.unlink()
+
+    for kept, shard_stats in results:
+        stats.add(shard_stats)
+        yield from kept
+
+
+# ─────────────────────────── ranking and reporting ──────────────────────────
+
+_OP_SPUT_OBJECT = 0x69   # 4-byte: opcode(1) reg(1) field_idx(2)
+
+
+class CredentialLocation(NamedTuple):
+    """Where in the bytecode a reported credential pair is loaded."""
+    dex:           int          # DEX ordinal (0 = classes.dex)
+    method:        str          # Lcls;->name(params)return (two, comma-separated, if they differ)
+    client_field:  str | None   # static field the client id is stored into, if any
+    secret_field:  str | None
+    client_offset: int          # byte offsets of the const-string within the method's insns
+    secret_offset: int
+
+
+class RankedCandidate(NamedTuple):
+    """One of the top_k mobile candidates kept across all DEX files (best first)."""
+    hits:      int
+    distance:  int
+    client_id: str
+    secret_id: str
+    location:  CredentialLocation
+    targets:   tuple[str, ...] = ()     # distinct target-pattern strings the method loads
+
 
+class _MobileCandidate(NamedTuple):
+    """Best client/secret pair of one method, ranked by (hits desc, distance asc)."""
+    hits:          int
+    distance:      int
+    client_id:     str
+    secret_id:     str
+    method_idx:    int
+    code_off:      int
+    client_offset: int
+    secret_offset: int
+    targets:       tuple[str, ...]
 
-def _class_all_strings(dex: bytes, strings: list[str], types: list[str], class_desc: str) -> list[str]:
-    """Collect all const-string values from every method in a specific class, in bytecode order."""
-    collected: list[str] = []
-    for cls, _acc, refs in _iter_class_methods(dex, strings, types):
-        if cls == class_desc:
-            collected.extend(strings[r.string_id] for r in refs)
-    return collected
+
+def _stored_field(dex: bytes, code_off: int, offset: int) -> int | None:
+    """Return the field_idx if the const-string at offset is directly followed by an
+    sput-object of the same register, i.e. the string initialises a static field."""
+    insns = code_off + 16
+    end = insns + struct.unpack_from('<I', dex, code_off + 12)[0] * 2
+    pos = insns + offset
+    nxt = pos + (4 if dex[pos] == _OP_CONST_STRING else 6)
+    if nxt + 4 <= end and dex[nxt] == _OP_SPUT_OBJECT and dex[nxt + 1] == dex[pos + 1]:
+        return struct.unpack_from('<H', dex, nxt + 2)[0]
+    return None
+
+
+def _locate(
+    dex: bytes,
+    types: _TypeIds,
+    strings: list[str],
+    client_site: tuple[int, int, int],
+    secret_site: tuple[int, int, int],
+) -> CredentialLocation:
+    """Resolve a winning pair to its method(s) and static fields, decoding only those ids.
+
+    A site is (method_idx, code_off, byte_offset) of a const-string.
+    """
+    methods = _MethodIds(dex, types, strings)
+    fields = _FieldIds(dex, types, strings)
+    c_midx, c_code, c_off = client_site
+    s_midx, s_code, s_off = secret_site
+    method = methods.format(c_midx)
+    if s_midx != c_midx:
+        method += f", {methods.format(s_midx)}"
+    client_field = _stored_field(dex, c_code, c_off)
+    secret_field = _stored_field(dex, s_code, s_off)
+    return CredentialLocation(
+        dex=0,
+        method=method,
+        client_field=None if client_field is None else fields.format(client_field),
+        secret_field=None if secret_field is None else fields.format(secret_field),
+        client_offset=c_off,
+        secret_offset=s_off,
+    )
+
+
+def _best_pair_in_method(
+    refs: list[_StringRef], strings: list[str], target_ids: set[int], method_idx: int, code_off: int,
+) -> _MobileCandidate | None:
+    """Return the closest client/secret pair in a method that references >= 2 target strings."""
+    target_hits = sum(1 for r in refs if r.string_id in target_ids)
+    if target_hits < 2:
+        return None
+
+    secrets = [r for r in refs if _RE_SECRET_MOBILE.match(strings[r.string_id])]
+    clients = [r for r in refs if _RE_CLIENT_MOBILE.match(strings[r.string_id])]
+    if not secrets or not clients:
+        return None
+
+    # exclude target-pattern strings that happen to match the length regexes
+    secrets = [r for r in secrets if strings[r.string_id] not in TARGET_PATTERNS]
+    clients = [r for r in clients if strings[r.string_id] not in TARGET_PATTERNS]
+    if not secrets or not clients:
+        return None
+
+    # refs are in bytecode order, so both lists are sorted by offset: merge them,
+    # comparing each secret only with the clients just before and after it.
+    # Ties keep the earlier secret and, for one secret, the earlier client.
+    best: tuple[int, _StringRef, _StringRef] | None = None
+    j = 0
+    n_clients = len(clients)
+    for sr in secrets:
+        while j < n_clients and clients[j].byte_offset < sr.byte_offset:
+            j += 1
+        for cr in clients[max(j - 1, 0): j + 1]:
+            dist = abs(sr.byte_offset - cr.byte_offset)
+            if best is None or dist < best[0]:
+                best = (dist, cr, sr)
+    dist, cr, sr = best
+    targets = tuple(sorted({strings[r.string_id] for r in refs if r.string_id in target_ids}))
+    return _MobileCandidate(target_hits, dist, strings[cr.string_id], strings[sr.string_id],
+                            method_idx, code_off, cr.byte_offset, sr.byte_offset, targets)
+
+
+def _rank_key(cand: _MobileCandidate | RankedCandidate) -> tuple[int, int]:
+    """Ranking: more target hits wins, then smaller bytecode distance.
+
+    Sorts ascending from the best; with a stable sort, ties keep the earlier candidate.
+    """
+    return -cand.hits, cand.distance
+
+
+_MIN_PAIR_DISTANCE = 4    # two distinct const-string instructions are at least 4 bytes apart
+
+
+def _min_hits(bar: tuple[int, int] | None) -> int:
+    """Fewest target hits a later candidate needs to outrank bar, the (hits, distance) of the last kept one.
+
+    Later candidates lose ties, so equal hits only suffice while bar's distance
+    can still be undercut. Without a bar, any qualifying method (2 hits) counts.
+    """
+    if bar is None:
+        return 2
+    hits, distance = bar
+    return max(2, hits + 1 if distance <= _MIN_PAIR_DISTANCE else hits)
+
+
+def _dex_hit_bound(dex: bytes, target_ids: set[int]) -> int:
+    """Upper bound on the target hits of any one method, from the DEX's raw xref count.
+
+    Counts const-string / const-string/jumbo byte patterns that name a target
+    string id anywhere in the code section, aligned or not and overlapping, so
+    it can only overcount the refs a method will yield.
+    """
+    if not target_ids:
+        return 0
+    lo, hi = _section_span(dex, _TYPE_CODE_ITEM) or (0, len(dex))
+    ids = sorted(target_ids)
+    # one regex per opcode: a single alternation of both is several times slower
+    patterns = [(_OP_CONST_STRING_JUMBO, [struct.pack('<I', t) for t in ids])]
+    short = [struct.pack('<H', t) for t in ids if t < 0x10000]
+    if short:
+        patterns.append((_OP_CONST_STRING, short))
+    count = 0
+    for opcode, operands in patterns:
+        rx = re.compile(re.escape(bytes((opcode,))) + b'.(?:' + b'|'.join(map(re.escape, operands)) + b')',
+                        re.DOTALL)
+        m = rx.search(dex, lo, hi)
+        while m:
+            count += 1
+            m = rx.search(dex, m.start() + 1, hi)
+    return count
+
+
+def _merge_ranked(kept: list[RankedCandidate], new: list[RankedCandidate], top_k: int) -> list[RankedCandidate]:
+    """Merge a later DEX's candidates into the running top_k list (earlier ones win ties)."""
+    return sorted(kept + new, key=_rank_key)[:top_k]
+
+
+def _pick_tv_pair(const_strings: list[str]) -> tuple[int | None, int | None]:
+    """Pick the client_id/secret pair from the Constants class strings (bytecode order).
+
+    Returns the indices of the chosen strings in const_strings.
+    """
+    client = None
+    secret = None
+    for i, s in enumerate(const_strings):
+        if client is None and _RE_CLIENT_TV.match(s) and '.' not in s:
+            client = i
+            for j in range(i + 1, min(i + 9, len(const_strings))):
+                s2 = const_strings[j]
+                if _RE_SECRET_TV.match(s2) and '.' not in s2:
+                    secret = j
+                    break
+            if secret is not None:
+                break
+
+    if secret is None:
+        # fallback: first plausible secret in the whole class
+        client_id = const_strings[client] if client is not None else None
+        for j, s in enumerate(const_strings):
+            if _RE_SECRET_TV.match(s) and '.' not in s and s != client_id:
+                secret = j
+                break
+    return client, secret
+
+
+class _DexScan(NamedTuple):
+    """Result of one walk over a DEX for the requested strategies."""
+    n_strings:       int
+    n_targets:       int                          # strings matching TARGET_PATTERNS (mobile)
+    mobile_ranked:   list[RankedCandidate]        # best top_k mobile candidates, best first
+    tv_count:        int | None                   # Constants class strings, None if class absent
+    tv_pair:         tuple[str, str] | None
+    tv_location:     CredentialLocation | None
+    stats:           _ScanStats
+    hit_bound:       int | None = None            # _dex_hit_bound (mobile), None if not computed
+    bound_pruned:    bool = False                 # mobile walk skipped: the bound cannot beat `floor`
+
+
+def _scan_dex(
+    dex: bytes,
+    *,
+    mobile: bool,
+    tv: bool,
+    pool: ProcessPoolExecutor | None = None,
+    n_shards: int = 1,
+    budget: Budget | None = None,
+    top_k: int = 1,
+    bar: tuple[int, int] | None = None,
+) -> _DexScan | None:
+    """Walk a DEX once, feeding the mobile ranking and/or the TV Constants collector.
+
+    The string pool, type table and method iteration are shared between the two
+    strategies. Returns None when the DEX cannot hold either kind of credentials.
+    With a pool, DEX files of at least SHARD_MIN_CLASS_DEFS classes are split
+    into n_shards class_def ranges scanned in parallel. The top_k mobile
+    candidates are kept in a bounded heap; only they and the TV pair are
+    resolved to a CredentialLocation.
+
+    bar is the (hits, distance) of the last of top_k candidates already kept
+    from earlier DEX files. Work that cannot produce a candidate outranking it
+    (or the local heap, once full) is skipped: the whole mobile walk if the
+    DEX's hit bound is too low, and any method with too few refs. The ranking
+    is the same as without the bar.
+
+    Corrupt structures raise MalformedPackageError; budget bounds the wall time.
+    """
+    if dex[:4] != b'dex\n':
+        return None
+    _validate_header(dex)
+    strings = _extract_strings(dex)
+    if not strings:
+        return None
+    if budget is not None:
+        budget.check('dex')
+
+    target_ids: set[int] = set()
+    if mobile:
+        target_ids = {i for i, s in enumerate(strings) if any(p in s for p in TARGET_PATTERNS)}
+    mobile = bool(target_ids)
+    hit_bound = None
+    if mobile:
+        hit_bound = _dex_hit_bound(dex, target_ids)
+        mobile = hit_bound >= _min_hits(bar)
+    bound_pruned = hit_bound is not None and not mobile
+    pruned = _DexScan(len(strings), len(target_ids), [], None, None, None, _ScanStats(), hit_bound, True)
+    if not (mobile or tv):
+        return pruned if bound_pruned else None
+
+    types = _TypeIds(dex, strings)
+    tv_type_idx = types.find(TV_CONSTANTS_CLASS) if tv else -1
+    tv = tv_type_idx >= 0
+    if not (mobile or tv):
+        return pruned if bound_pruned else None
+
+    # min-heap of (hits, -distance, -seq, candidate): heap[0] is the worst kept,
+    # and a later candidate never displaces an equal earlier one
+    heap: list[tuple[int, int, int, _MobileCandidate]] = []
+    seq = 0
+    tv_strings: list[str] = []
+    tv_sites: list[tuple[int, int, int]] = []     # (method_idx, code_off, byte_offset)
+    stats = _ScanStats()
+    n_cls = struct.unpack_from('<I', dex, 0x60)[0]
+    stats.classes = n_cls
+
+    # mobile: prune out-of-scope classes; TV only: walk the Constants class alone
+    if mobile:
+        skip = _scope_mask(dex)
+        if skip is not None:
+            if tv:
+                skip[tv_type_idx] = 0
+            stats.scoped = True
+            stats.code_bytes_skipped = _estimate_skipped_code(dex, skip)
+    else:
+        skip = bytearray(b'\x01' * len(types))
+        skip[tv_type_idx] = 0
+
+    # raised as the heap fills; read by the walk for every method
+    floor = _HitFloor(_min_hits(bar), tv_type_idx) if mobile else None
+    if pool is not None and n_shards > 1 and n_cls >= SHARD_MIN_CLASS_DEFS:
+        methods = _iter_code_refs_sharded(dex, len(strings), target_ids, tv_type_idx, pool, n_shards, stats,
+                                          skip, floor.hits if floor else 2, budget)
+    else:
+        methods = _iter_code_refs(dex, len(strings), stats, budget=budget, skip=skip, floor=floor)
+    for type_idx, method_idx, _acc, code_off, refs in methods:
+        if type_idx == tv_type_idx:
+            tv_strings.extend(strings[r.string_id] for r in refs)
+            tv_sites.extend((method_idx, code_off, r.byte_offset) for r in refs)
+        if mobile:
+            if sum(1 for r in refs if r.string_id in target_ids) < floor.hits:
+                continue
+            cand = _best_pair_in_method(refs, strings, target_ids, method_idx, code_off)
+            if cand is not None:
+                item = (cand.hits, -cand.distance, -seq, cand)
+                seq += 1
+                if len(heap) < top_k:
+                    heapq.heappush(heap, item)
+                elif item > heap[0]:
+                    heapq.heapreplace(heap, item)
+                if len(heap) == top_k:
+                    floor.hits = max(floor.hits, _min_hits((heap[0][0], -heap[0][1])))
+
+    ranked = [
+        RankedCandidate(c.hits, c.distance, c.client_id, c.secret_id,
+                        _locate(dex, types, strings,
+                                (c.method_idx, c.code_off, c.client_offset),
+                                (c.method_idx, c.code_off, c.secret_offset)),
+                        c.targets)
+        for *_key, c in sorted(heap, reverse=True)
+    ]
+
+    tv_pair = tv_location = None
+    if tv:
+        ci, si = _pick_tv_pair(tv_strings)
+        if ci is not None and si is not None:
+            tv_pair = (tv_strings[ci], tv_strings[si])
+            tv_location = _locate(dex, types, strings, tv_sites[ci], tv_sites[si])
+
+    return _DexScan(len(strings), len(target_ids), ranked,
+                    len(tv_strings) if tv else None, tv_pair, tv_location, stats, hit_bound, bound_pruned)
+
+
+# ─────────────────────────── single-class probes ────────────────────────────
+
+def _walk_class(
+    dex: bytes, class_desc: str,
+) -> tuple[_StringIds, _TypeIds, list[tuple[int, int, list[_StringRef]]]] | None:
+    """Walk the methods of class_desc alone: (strings, types, [(method_idx, code_off, refs)]).
+
+    A raw byte search rejects DEX files that do not mention the class; then the
+    class is found by binary search and strings are decoded lazily, so the cost
+    is that of the class rather than of the DEX. None if it is not defined here.
+    """
+    if dex[:4] != b'dex\n' or dex.find(class_desc.encode()) < 0:
+        return None
+    _validate_header(dex)
+    strings = _StringIds(dex)
+    types = _TypeIds(dex, strings)
+    type_idx = types.find(class_desc)
+    if type_idx < 0:
+        return None
+
+    n_cls   = struct.unpack_from('<I', dex, 0x60)[0]
+    off_cls = struct.unpack_from('<I', dex, 0x64)[0]
+    try:
+        cls_idx = _u32_table(dex, off_cls, n_cls * 8)[::8].index(type_idx)
+    except ValueError:
+        return None                              # type only referenced here, not defined
+
+    walk = _iter_code_refs(dex, len(strings), start=cls_idx, stop=cls_idx + 1)
+    return strings, types, [(method_idx, code_off, refs) for _t, method_idx, _a, code_off, refs in walk]
+
+
+def _confirm_pair(dex: bytes, client_id: str, secret_id: str, class_desc: str) -> CredentialLocation | None:
+    """Check that class_desc still loads client_id and secret_id, without a ranking scan."""
+    if any(dex.find(v.encode()) < 0 for v in (client_id, secret_id)):
+        return None
+    walked = _walk_class(dex, class_desc)
+    if walked is None:
+        return None
+    strings, types, methods = walked
+    client_sid, secret_sid = strings.find(client_id), strings.find(secret_id)
+
+    sites: dict[int, tuple[int, int, int]] = {}
+    for method_idx, code_off, refs in methods:
+        for r in refs:
+            if r.string_id in (client_sid, secret_sid):
+                sites.setdefault(r.string_id, (method_idx, code_off, r.byte_offset))
+    if client_sid not in sites or secret_sid not in sites:
+        return None
+    return _locate(dex, types, strings, sites[client_sid], sites[secret_sid])
+
+
+def _probe_mobile(dex: bytes, class_desc: str) -> RankedCandidate | None:
+    """Best mobile candidate among the methods of class_desc, ranked as in a full scan."""
+    walked = _walk_class(dex, class_desc)
+    if walked is None:
+        return None
+    strings, types, methods = walked
+    best: _MobileCandidate | None = None
+    for method_idx, code_off, refs in methods:
+        target_ids = {r.string_id for r in refs if any(p in strings[r.string_id] for p in TARGET_PATTERNS)}
+        cand = _best_pair_in_method(refs, strings, target_ids, method_idx, code_off)
+        if cand is not None and (best is None or _rank_key(cand) < _rank_key(best)):
+            best = cand
+    if best is None:
+        return None
+    location = _locate(dex, types, strings, (best.method_idx, best.code_off, best.client_offset),
+                       (best.method_idx, best.code_off, best.secret_offset))
+    return RankedCandidate(best.hits, best.distance, best.client_id, best.secret_id, location, best.targets)
+
+
+def _probe_tv(dex: bytes, class_desc: str) -> tuple[tuple[str, str], CredentialLocation] | None:
+    """TV pair of class_desc picked as in a full scan, with its location."""
+    walked = _walk_class(dex, class_desc)
+    if walked is None:
+        return None
+    strings, types, methods = walked
+    tv_strings: list[str] = []
+    tv_sites: list[tuple[int, int, int]] = []
+    for method_idx, code_off, refs in methods:
+        tv_strings.extend(strings[r.string_id] for r in refs)
+        tv_sites.extend((method_idx, code_off, r.byte_offset) for r in refs)
+    ci, si = _pick_tv_pair(tv_strings)
+    if ci is None or si is None:
+        return None
+    return (tv_strings[ci], tv_strings[si]), _locate(dex, types, strings, tv_sites[ci], tv_sites[si])
+
+
+def _cancel_source(dex_files: Iterable[bytes]) -> None:
+    """Stop a streaming DEX source (e.g. a DexPipeline) once no more buffers are needed."""
+    cancel = getattr(dex_files, 'cancel', None)
+    if cancel is not None:
+        cancel()
 
 
 # ─────────────────────────── public extraction API ──────────────────────────
@@ -145,57 +1099,168 @@ def _class_all_strings(dex: bytes, strings: list[str], types: list[str], class_d
 class DexExtractor:
     """Credential extractor that works directly on DEX binary data."""
 
-    def __init__(self, verbose: bool = True):
+    def __init__(
+        self,
+        verbose: bool = True,
+        metrics: Metrics | None = None,
+        workers: int = SCAN_WORKERS,
+        top_k: int = MOBILE_TOP_K,
+    ):
         self._verbose = verbose
+        self.metrics = metrics
+        self.workers = max(0, workers)           # 0 = chosen by plan()
+        self.top_k = max(1, top_k)
+        self._n_shards = (self.workers or 1) if can_start_workers() else 1
+        self._pool: ProcessPoolExecutor | None = None
+        self._pool_size = 0
+        self.last_plan: ScanPlan | None = None
+        self.last_location: CredentialLocation | None = None
+        self.last_candidates: list[RankedCandidate] = []
+
+    def close(self) -> None:
+        """Shut down the shard worker pool, if one was started."""
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
+            self._pool_size = 0
+
+    def _start_pool(self) -> None:
+        """Start (or grow) the shard pool before a scan starts iterating its DEX files.
+
+        Iterating a DexPipeline starts its inflater thread, and forking while
+        that thread holds a lock would copy the held lock into the workers.
+        """
+        if self._n_shards > 1 and self._pool_size < self._n_shards:
+            self.close()
+            self._pool = ProcessPoolExecutor(max_workers=self._n_shards)
+            self._pool_size = self._n_shards
+
+    def plan(self, dex_sizes: list[int], dex_headers: list[bytes]) -> ScanPlan:
+        """Choose worker count, scan backend and loading mode for the next package.
+
+        Uses the DEX count, uncompressed sizes and header counts, the CPUs
+        available and a calibration measured once and stored locally. A fixed
+        workers setting is kept; only the other choices are planned then. In a
+        daemonic process (a multiprocessing.Pool worker) the plan is serial.
+        """
+        shapes = [dex_shape(size, header) for size, header in zip(dex_sizes, dex_headers)]
+        cpus, workers = available_cpus(), self.workers or None
+        if not can_start_workers():
+            cpus, workers = 1, 1
+        plan = plan_scan(shapes, load_calibration(log=self._log), cpus=cpus, workers=workers,
+                         pool_running=self._pool is not None)
+        self._n_shards = plan.workers
+        self.last_plan = plan
+        self._log(f"\n[planner] {len(shapes)} DEX, {sum(dex_sizes) / 1e6:.1f} MB, "
+                  f"{sum(d.n_strings for d in shapes)} strings, {sum(d.n_classes for d in shapes)} classes, "
+                  f"{cpus} CPU(s) → {plan.describe()} (predicted {plan.predicted_s:.2f}s)")
+        return plan
+
+    def _scan(
+        self,
+        idx: int,
+        dex: bytes,
+        *,
+        mobile: bool,
+        tv: bool,
+        budget: Budget | None,
+        ranked: list[RankedCandidate] | None = None,
+    ) -> _DexScan | None:
+        if dex[:4] == b'dex\n':
+            t0 = time.perf_counter()
+            try:
+                can_mobile, can_tv = _prescreen(dex, mobile=mobile, tv=tv)
+            except struct.error as e:
+                raise MalformedPackageError('dex', f"truncated or corrupt DEX ({e})") from e
+            if not (can_mobile or can_tv):
+                missing = [what for what, wanted in (('target pattern', mobile), (TV_CONSTANTS_CLASS, tv)) if wanted]
+                self._log(f"  [DEX {idx}] pre-screen: no {' or '.join(missing)} in string data, "
+                          f"rejected in {(time.perf_counter() - t0) * 1e3:.2f} ms")
+                self._record(None)
+                if self.metrics is not None:
+                    self.metrics.inc('dex_files_rejected_total')
+                return None
+            mobile, tv = can_mobile, can_tv
+        try:
+            scan = _scan_dex(dex, mobile=mobile, tv=tv, pool=self._pool, n_shards=self._n_shards,
+                             budget=budget, top_k=self.top_k, bar=self._bar(ranked))
+        except (IndexError, struct.error) as e:
+            # an offset the bounds checks could not rule out points outside the buffer
+            raise MalformedPackageError('dex', f"truncated or corrupt DEX ({e})") from e
+        self._record(scan)
+        if scan is not None and scan.bound_pruned:
+            bar = self._bar(ranked)
+            beaten = f"kept candidate (hits={bar[0]}, dist={bar[1]})" if bar else "2 needed to qualify"
+            self._log(f"  [DEX {idx}] at most {scan.hit_bound} target hit(s) per method, cannot beat the "
+                      f"{beaten}; mobile walk skipped")
+        if scan is not None and scan.stats.scoped and scan.stats.classes_skipped:
+            st = scan.stats
+            self._log(f"  [DEX {idx}] scope: skipped {st.classes_skipped}/{st.classes} classes "
+                      f"(~{st.code_bytes_skipped / 1024:.0f} KB of code)")
+        if scan is not None and scan.stats.methods_pruned:
+            self._log(f"  [DEX {idx}] bound: {scan.stats.methods_pruned} method(s) too short to beat the ranking")
+        return scan
+
+    def _bar(self, ranked: list[RankedCandidate] | None) -> tuple[int, int] | None:
+        """(hits, distance) a later candidate has to beat once top_k are kept, else None."""
+        if not ranked or len(ranked) < self.top_k:
+            return None
+        return ranked[-1].hits, ranked[-1].distance
 
     def _log(self, msg: str) -> None:
         if self._verbose:
             print(msg)
 
+    def _set_location(self, location: CredentialLocation | None, dex_idx: int) -> None:
+        self.last_location = location._replace(dex=dex_idx) if location is not None else None
+
+    def _log_location(self) -> None:
+        loc = self.last_location
+        if loc is None:
+            return
+        self._log(f"  Source: [DEX {loc.dex}] {loc.method}")
+        if loc.client_field:
+            self._log(f"    client id → {loc.client_field}")
+        if loc.secret_field:
+            self._log(f"    secret id → {loc.secret_field}")
+
+    def _record(self, scan: _DexScan | None) -> None:
+        """Report one DEX worth of scan counters (called once per DEX, not per method)."""
+        if self.metrics is None:
+            return
+        self.metrics.inc('dex_files_scanned_total')
+        if scan is not None:
+            self.metrics.inc('methods_scanned_total', scan.stats.methods)
+            self.metrics.inc('code_bytes_scanned_total', scan.stats.code_bytes)
+            if scan.stats.scoped:
+                self.metrics.inc('classes_skipped_total', scan.stats.classes_skipped)
+            self.metrics.inc('methods_pruned_total', scan.stats.methods_pruned)
+
     # ── TV ──────────────────────────────────────────────────────────────────
 
-    def find_tv_credentials(self, dex_files: list[bytes]) -> tuple[str | None, str | None]:
+    def find_tv_credentials(
+        self, dex_files: Iterable[bytes], budget: Budget | None = None,
+    ) -> tuple[str | None, str | None]:
         """Find TV client_id and client_secret from the API Constants class."""
         self._log(f"\n=== PHASE 2 (TV): SCANNING {len(dex_files)} DEX FILE(S) ===")
         t0 = time.time()
+        self.last_location = None
+        self.last_candidates = []
 
+        self._start_pool()
         for idx, dex in enumerate(dex_files):
-            strings = _extract_strings(dex)
-            if not strings:
+            scan = self._scan(idx, dex, mobile=False, tv=True, budget=budget)
+            if scan is None or not scan.tv_count:
                 continue
-            types = _extract_types(dex, strings)
 
-            if not any(TV_CONSTANTS_CLASS in t for t in types):
-                continue
-
-            const_strings = _class_all_strings(dex, strings, types, TV_CONSTANTS_CLASS)
-            if not const_strings:
-                continue
-
-            self._log(f"  [DEX {idx}] Found {TV_CONSTANTS_CLASS} → {len(const_strings)} strings")
-
-            client_id = None
-            secret_id = None
-            for i, s in enumerate(const_strings):
-                if client_id is None and _RE_CLIENT_TV.match(s) and '.' not in s:
-                    client_id = s
-                    for s2 in const_strings[i + 1: i + 9]:
-                        if _RE_SECRET_TV.match(s2) and '.' not in s2:
-                            secret_id = s2
-                            break
-                    if secret_id:
-                        break
-
-            if not secret_id:
-                # fallback: first plausible secret in the whole class
-                for s in const_strings:
-                    if _RE_SECRET_TV.match(s) and '.' not in s and s != client_id:
-                        secret_id = s
-                        break
-
-            if client_id and secret_id:
+            self._log(f"  [DEX {idx}] Found {TV_CONSTANTS_CLASS} → {scan.tv_count} strings")
+            if scan.tv_pair:
+                _cancel_source(dex_files)
+                client_id, secret_id = scan.tv_pair
+                self._set_location(scan.tv_location, idx)
                 self._log(f"  Client ID: {client_id}")
                 self._log(f"  Secret ID: {secret_id}")
+                self._log_location()
                 self._log(f"  Extracted in {time.time() - t0:.2f}s")
                 return client_id, secret_id
 
@@ -204,55 +1269,199 @@ class DexExtractor:
 
     # ── Mobile ──────────────────────────────────────────────────────────────
 
-    def find_mobile_credentials(self, dex_files: list[bytes]) -> tuple[str | None, str | None]:
+    def find_mobile_credentials(
+        self, dex_files: Iterable[bytes], budget: Budget | None = None,
+    ) -> tuple[str | None, str | None]:
         """Find mobile client_id and secret by scanning code items for target-pattern proximity."""
         self._log(f"\n=== PHASE 2 (MOBILE): SCANNING {len(dex_files)} DEX FILE(S) ===")
         t0 = time.time()
+        self.last_location = None
+        self.last_candidates = []
 
-        best: tuple[str, str, int, float] | None = None   # (client, secret, hits, dist)
-
+        ranked: list[RankedCandidate] = []
+        self._start_pool()
         for idx, dex in enumerate(dex_files):
-            strings = _extract_strings(dex)
-            if not strings:
+            scan = self._scan(idx, dex, mobile=True, tv=False, budget=budget, ranked=ranked)
+            if scan is None:
                 continue
+            self._log(f"  [DEX {idx}] {scan.n_strings} strings, {scan.n_targets} target-pattern hits")
+            ranked = _merge_ranked(ranked, self._with_dex(scan.mobile_ranked, idx), self.top_k)
+
+        self.last_candidates = ranked
+        if ranked:
+            best = ranked[0]
+            self.last_location = best.location
+            self._log_mobile(best, t0)
+            return best.client_id, best.secret_id
+
+        self._log("  Mobile credentials not found.")
+        return None, None
 
-            target_ids = {i for i, s in enumerate(strings) if any(p in s for p in TARGET_PATTERNS)}
-            if not target_ids:
+    @staticmethod
+    def _with_dex(ranked: list[RankedCandidate], dex_idx: int) -> list[RankedCandidate]:
+        return [c._replace(location=c.location._replace(dex=dex_idx)) for c in ranked]
+
+    def _log_mobile(self, best: RankedCandidate, t0: float) -> None:
+        self._log(f"  Client ID: {best.client_id}")
+        self._log(f"  Secret ID: {best.secret_id}")
+        self._log(f"  (target hits: {best.hits}, bytecode distance: {best.distance})")
+        self._log_location()
+        if self.top_k > 1:
+            self._log(f"  Top {len(self.last_candidates)} candidate(s):")
+            for rank, c in enumerate(self.last_candidates, 1):
+                self._log(f"    {rank}. hits={c.hits} dist={c.distance} {c.client_id} / {c.secret_id}"
+                          f"  [DEX {c.location.dex}] {c.location.method}"
+                          f" +0x{c.location.client_offset:x}/+0x{c.location.secret_offset:x}")
+        self._log(f"  Extracted in {time.time() - t0:.2f}s")
+
+    # ── Previous result ─────────────────────────────────────────────────────
+
+    def confirm_previous_credentials(
+        self,
+        dex_files: Iterable[bytes],
+        client_id: str,
+        secret_id: str,
+        class_desc: str,
+        budget: Budget | None = None,
+    ) -> bool:
+        """Return True if class_desc of some DEX still loads the previous client id and secret.
+
+        This is a cheap change check; a False result means the credentials may
+        have changed and a full scan is needed.
+        """
+        self._log(f"\n=== PHASE 2 (COMPARE): CHECKING PREVIOUS CREDENTIALS IN {len(dex_files)} DEX FILE(S) ===")
+        t0 = time.time()
+        self.last_location = None
+        self.last_candidates = []
+
+        for idx, dex in enumerate(dex_files):
+            if budget is not None:
+                budget.check('dex')
+            try:
+                location = _confirm_pair(dex, client_id, secret_id, class_desc)
+            except (IndexError, struct.error) as e:
+                raise MalformedPackageError('dex', f"truncated or corrupt DEX ({e})") from e
+            if location is not None:
+                _cancel_source(dex_files)
+                self._set_location(location, idx)
+                self._log(f"  Previous credentials still loaded by {class_desc}")
+                self._log_location()
+                self._log(f"  Checked in {time.time() - t0:.2f}s")
+                return True
+
+        self._log("  Previous credentials not confirmed; running a full scan.")
+        return False
+
+    # ── Last winning location ───────────────────────────────────────────────
+
+    def probe_history(
+        self,
+        dex_files: Iterable[bytes],
+        mode: str,
+        entry: HistoryEntry,
+        budget: Budget | None = None,
+    ) -> tuple[str | None, str | None]:
+        """Look for mode's credentials where they were found last time, before any full scan.
+
+        Only entry.dex is loaded and only entry.class_desc is walked. The result
+        is accepted if the best candidate of that class is still in the recorded
+        method and (mobile) loads at least the recorded target strings, with no
+        fewer hits; otherwise (None, None) and a full scan is needed.
+        """
+        self._log(f"\n=== PHASE 2 (HISTORY): PROBING [DEX {entry.dex}] {entry.class_desc} ===")
+        t0 = time.time()
+        self.last_location = None
+        self.last_candidates = []
+        if entry.dex >= len(dex_files):
+            self._log(f"  Package has only {len(dex_files)} DEX file(s); running a full scan.")
+            return None, None
+        if budget is not None:
+            budget.check('dex')
+
+        dex = dex_files[entry.dex]
+        try:
+            if mode == 'tv':
+                found = _probe_tv(dex, entry.class_desc)
+                location = found[1] if found else None
+            else:
+                cand = _probe_mobile(dex, entry.class_desc)
+                location = cand.location if cand else None
+        except (IndexError, struct.error) as e:
+            raise MalformedPackageError('dex', f"truncated or corrupt DEX ({e})") from e
+
+        if location is None:
+            reason = "no candidate in the recorded class"
+        elif location.method != entry.method:
+            reason = f"best candidate moved to {location.method}"
+        elif mode != 'tv' and cand.hits < entry.hits:
+            reason = f"target hits dropped from {entry.hits} to {cand.hits}"
+        elif mode != 'tv' and not set(entry.neighborhood) <= set(cand.targets):
+            reason = "the method no longer loads the recorded target strings"
+        else:
+            reason = None
+        if reason is not None:
+            self._log(f"  Not confirmed ({reason}); running a full scan.")
+            return None, None
+
+        self._set_location(location, entry.dex)
+        if mode == 'tv':
+            client_id, secret_id = found[0]
+        else:
+            self.last_candidates = [cand._replace(location=self.last_location)]
+            client_id, secret_id = cand.client_id, cand.secret_id
+        self._log(f"  Client ID: {client_id}")
+        self._log(f"  Secret ID: {secret_id}")
+        self._log_location()
+        self._log(f"  Confirmed at the recorded location in {(time.time() - t0) * 1000:.1f} ms")
+        return client_id, secret_id
+
+    # ── Mobile + TV in one pass ─────────────────────────────────────────────
+
+    def find_credentials_combined(
+        self, dex_files: Iterable[bytes], budget: Budget | None = None,
+    ) -> tuple[str | None, str | None, str | None]:
+        """Run the mobile ranking and the TV Constants lookup in a single walk over each DEX.
+
+        Returns (client_id, secret_id, mode) where mode is 'mobile' or 'tv'. The
+        mobile result wins when both exist, matching a mobile scan followed by a
+        TV fallback, but every string pool is decoded only once.
+        """
+        self._log(f"\n=== PHASE 2 (MOBILE+TV): SCANNING {len(dex_files)} DEX FILE(S) ===")
+        t0 = time.time()
+        self.last_location = None
+        self.last_candidates = []
+
+        ranked: list[RankedCandidate] = []
+        tv_pair: tuple[str, str] | None = None
+        tv_location: CredentialLocation | None = None
+        self._start_pool()
+        for idx, dex in enumerate(dex_files):
+            scan = self._scan(idx, dex, mobile=True, tv=tv_pair is None, budget=budget, ranked=ranked)
+            if scan is None:
                 continue
+            if scan.n_targets:
+                self._log(f"  [DEX {idx}] {scan.n_strings} strings, {scan.n_targets} target-pattern hits")
+            ranked = _merge_ranked(ranked, self._with_dex(scan.mobile_ranked, idx), self.top_k)
+            if scan.tv_count:
+                self._log(f"  [DEX {idx}] Found {TV_CONSTANTS_CLASS} → {scan.tv_count} strings")
+                if scan.tv_pair:
+                    tv_pair = scan.tv_pair
+                    tv_location = scan.tv_location._replace(dex=idx)
 
-            types = _extract_types(dex, strings)
-            self._log(f"  [DEX {idx}] {len(strings)} strings, {len(target_ids)} target-pattern hits")
-
-            for _cls, _acc, refs in _iter_class_methods(dex, strings, types):
-                target_hits = sum(1 for r in refs if r.string_id in target_ids)
-                if target_hits < 2:
-                    continue
-
-                secrets = [r for r in refs if _RE_SECRET_MOBILE.match(strings[r.string_id])]
-                clients = [r for r in refs if _RE_CLIENT_MOBILE.match(strings[r.string_id])]
-                if not secrets or not clients:
-                    continue
-
-                # exclude target-pattern strings that happen to match the length regexes
-                secrets = [r for r in secrets if strings[r.string_id] not in TARGET_PATTERNS]
-                clients = [r for r in clients if strings[r.string_id] not in TARGET_PATTERNS]
-                if not secrets or not clients:
-                    continue
-
-                for sr in secrets:
-                    for cr in clients:
-                        dist = abs(sr.byte_offset - cr.byte_offset)
-                        if best is None or target_hits > best[2] or (
-                                target_hits == best[2] and dist < best[3]):
-                            best = (strings[cr.string_id], strings[sr.string_id], target_hits, dist)
-
-        if best:
-            client_id, secret_id, hits, dist = best
-            self._log(f"  Client ID: {client_id}")
-            self._log(f"  Secret ID: {secret_id}")
-            self._log(f"  (target hits: {hits}, bytecode distance: {dist})")
+        self.last_candidates = ranked
+        if ranked:
+            best = ranked[0]
+            self.last_location = best.location
+            self._log_mobile(best, t0)
+            return best.client_id, best.secret_id, 'mobile'
+        if tv_pair:
+            self.last_location = tv_location
+            self._log("  Mobile credentials not found; using TV Constants class.")
+            self._log(f"  Client ID: {tv_pair[0]}")
+            self._log(f"  Secret ID: {tv_pair[1]}")
+            self._log_location()
             self._log(f"  Extracted in {time.time() - t0:.2f}s")
-            return client_id, secret_id
+            return tv_pair[0], tv_pair[1], 'tv'
 
-        self._log("  Mobile credentials not found.")
-        return None, None
+        self._log("  Credentials not found (mobile or TV).")
+        return None, None, None
@@ -0,0 +1,181 @@
+"""Persistent string/xref index over a package's DEX files for fast "dex grep" queries."""
+import array
+import bisect
+import hashlib
+import os
+import pickle
+import re
+import time
+from dataclasses import dataclass
+from typing import NamedTuple
+
+from .apk_reader import load_package
+from .config import INDEX_CACHE_DIR
+from .dex_extractor import (
+    _extract_strings,
+    _iter_code_refs,
+    _MethodIds,
+    _TypeIds,
+    _validate_header,
+)
+from .limits import PackageError
+
+INDEX_FORMAT = 2      # bump when the pickled layout changes
+
+
+class Xref(NamedTuple):
+    """One const-string reference to a matched string."""
+    dex:         int    # DEX ordinal (0 = classes.dex)
+    string_id:   int
+    class_desc:  str
+    method:      str    # name(params)return
+    insn_offset: int    # byte offset within the method's instructions
+    file_offset: int    # byte offset of the instruction within the DEX file
+
+
+@dataclass
+class _DexTable:
+    strings:     list[str]
+    methods:     list[tuple[str, str, int]]   # (class descriptor, signature, code_off)
+    ref_sids:    array.array                  # string id of each ref, sorted
+    ref_methods: array.array                  # parallel: index into methods
+    ref_offsets: array.array                  # parallel: byte offset within insns
+
+
+def _index_dex(dex: bytes) -> _DexTable:
+    _validate_header(dex)
+    strings = _extract_strings(dex)
+    types = _TypeIds(dex, strings)
+    method_ids = _MethodIds(dex, types, strings)
+    methods: list[tuple[str, str, int]] = []
+    refs_flat: list[tuple[int, int, int]] = []
+    for type_idx, method_idx, _acc, code_off, refs in _iter_code_refs(dex, len(strings)):
+        slot = len(methods)
+        methods.append((
+            types[type_idx],
+            method_ids.signature(method_idx),
+            code_off,
+        ))
+        refs_flat.extend((r.string_id, slot, r.byte_offset) for r in refs)
+    refs_flat.sort()
+    return _DexTable(
+        strings=strings,
+        methods=methods,
+        ref_sids=array.array('I', (r[0] for r in refs_flat)),
+        ref_methods=array.array('I', (r[1] for r in refs_flat)),
+        ref_offsets=array.array('I', (r[2] for r in refs_flat)),
+    )
+
+
+class DexIndex:
+    """String pools and const-string xrefs of every DEX in a package."""
+
+    def __init__(self, tables: list[_DexTable]):
+        self._tables = tables
+
+    @classmethod
+    def build(cls, dex_files) -> 'DexIndex':
+        return cls([_index_dex(dex) for dex in dex_files if dex[:4] == b'dex\n'])
+
+    def search(self, pattern: str, *, regex: bool = False) -> list[tuple[int, int, str]]:
+        """Return (dex, string_id, string) for every string matching a substring or regex."""
+        hits: list[tuple[int, int, str]] = []
+        if regex:
+            rx = re.compile(pattern)
+            match = lambda s: rx.search(s) is not None
+        else:
+            match = lambda s: pattern in s
+        for d, table in enumerate(self._tables):
+            hits.extend((d, i, s) for i, s in enumerate(table.strings) if match(s))
+        return hits
+
+    def xrefs(self, dex: int, string_id: int) -> list[Xref]:
+        """Return every method location that loads strings[string_id] with const-string."""
+        table = self._tables[dex]
+        lo = bisect.bisect_left(table.ref_sids, string_id)
+        hi = bisect.bisect_right(table.ref_sids, string_id, lo)
+        out: list[Xref] = []
+        for k in range(lo, hi):
+            cls_desc, method, code_off = table.methods[table.ref_methods[k]]
+            off = table.ref_offsets[k]
+            out.append(Xref(dex, string_id, cls_desc, method, off, code_off + 16 + off))
+        return out
+
+
+def _cache_path(package_path: str, cache_dir: str) -> str:
+    st = os.stat(package_path)
+    key = f"{os.path.abspath(package_path)}|{st.st_size}|{st.st_mtime_ns}|{INDEX_FORMAT}"
+    return os.path.join(cache_dir, hashlib.sha1(key.encode()).hexdigest() + '.idx')
+
+
+def open_index(
+    package_path: str,
+    *,
+    cache_dir: str = INDEX_CACHE_DIR,
+    rebuild: bool = False,
+) -> tuple[DexIndex | None, bool]:
+    """Return (index, from_cache) for a package, building and storing it on a miss.
+
+    The cache key is the package's absolute path, size and mtime, so an index
+    is reused until the file changes. Returns (None, False) if the package
+    cannot be loaded; a missing file raises OSError and a corrupt one
+    PackageError.
+    """
+    path = _cache_path(package_path, cache_dir)
+    if not rebuild and os.path.exists(path):
+        try:
+            with open(path, 'rb') as fh:
+                return DexIndex(pickle.load(fh)), True
+        except Exception:
+            pass    # unreadable or stale cache entry: rebuild below
+
+    contents = load_package(package_path)
+    if contents is None:
+        return None, False
+    index = DexIndex.build(contents.dex_files)
+
+    os.makedirs(cache_dir, exist_ok=True)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, 'wb') as fh:
+        pickle.dump(index._tables, fh, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp, path)
+    return index, False
+
+
+def grep(
+    package_path: str,
+    pattern: str,
+    *,
+    regex: bool = False,
+    rebuild: bool = False,
+    limit: int = 50,
+) -> int:
+    """Print strings matching pattern and their xrefs. Returns the number of matched strings."""
+    if not os.path.isfile(package_path):
+        print(f"ERROR: File not found: {package_path}")
+        return 0
+    t0 = time.perf_counter()
+    try:
+        index, cached = open_index(package_path, rebuild=rebuild)
+    except (PackageError, OSError) as e:
+        print(f"ERROR: {e}")
+        return 0
+    if index is None:
+        print("ERROR: Failed to load package.")
+        return 0
+    t_index = time.perf_counter() - t0
+
+    t1 = time.perf_counter()
+    hits = index.search(pattern, regex=regex)
+    for dex, sid, s in hits[:limit]:
+        refs = index.xrefs(dex, sid)
+        print(f"[DEX {dex}] string #{sid} {s!r}  ({len(refs)} ref(s))")
+        for x in refs:
+            print(f"    {x.class_desc}->{x.method}  insn +0x{x.insn_offset:x}  file 0x{x.file_offset:x}")
+    if len(hits) > limit:
+        print(f"… {len(hits) - limit} more match(es) not shown (use --limit)")
+    t_query = time.perf_counter() - t1
+
+    source = "cached index" if cached else "index built"
+    print(f"\n{len(hits)} matching string(s); query {t_query * 1000:.1f} ms, {source} in {t_index * 1000:.1f} ms")
+    return len(hits)
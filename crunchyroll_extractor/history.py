@@ -0,0 +1,64 @@
+"""Where the credentials were found last time, so the next run can look there first."""
+import json
+import os
+import time
+from dataclasses import asdict, dataclass, field
+
+HISTORY_VERSION = 1
+
+
+@dataclass
+class HistoryEntry:
+    """Location of the last winning candidate of one mode."""
+    dex:          int                 # DEX ordinal (0 = classes.dex)
+    class_desc:   str                 # e.g. Lcom/crunchyroll/…/Config;
+    method:       str                 # Lcls;->name(params)return, as in CredentialLocation.method
+    hits:         int = 0             # target-pattern strings the method loaded (mobile)
+    neighborhood: list[str] = field(default_factory=list)   # those strings, sorted
+    version_name: str | None = None
+    recorded_at:  float = 0.0
+
+
+def load_history(path: str) -> dict[str, HistoryEntry]:
+    """Return {mode: entry} from the history file; empty if it is missing or unreadable."""
+    try:
+        with open(path, encoding='utf-8') as fh:
+            data = json.load(fh)
+        if data.get('version') != HISTORY_VERSION:
+            return {}
+        return {mode: HistoryEntry(**entry) for mode, entry in data['modes'].items()}
+    except (OSError, ValueError, TypeError, KeyError, AttributeError):
+        return {}
+
+
+def save_history(path: str, entries: dict[str, HistoryEntry]) -> None:
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, 'w', encoding='utf-8') as fh:
+        json.dump({'version': HISTORY_VERSION,
+                   'modes': {mode: asdict(e) for mode, e in entries.items()}}, fh, indent=2)
+    os.replace(tmp, path)
+
+
+def record_location(
+    entries: dict[str, HistoryEntry],
+    mode: str,
+    location,
+    *,
+    hits: int = 0,
+    neighborhood: tuple[str, ...] | list[str] = (),
+    version_name: str | None = None,
+) -> bool:
+    """Store a CredentialLocation as the mode's entry; returns True if the location changed."""
+    entry = HistoryEntry(
+        dex=location.dex,
+        class_desc=location.method.split('->', 1)[0],
+        method=location.method,
+        hits=hits,
+        neighborhood=sorted(neighborhood),
+        version_name=version_name,
+        recorded_at=time.time(),
+    )
+    old = entries.get(mode)
+    entries[mode] = entry
+    return old is None or (old.dex, old.method, old.neighborhood) != (entry.dex, entry.method, entry.neighborhood)
@@ -0,0 +1,78 @@
+"""Structured parse errors and per-package time/memory budgets."""
+import time
+
+
+class PackageError(Exception):
+    """A package could not be processed. Carries the failing component and location."""
+
+    kind = 'error'
+
+    def __init__(self, component: str, reason: str, offset: int | None = None):
+        self.component = component
+        self.reason = reason
+        self.offset = offset
+        where = f" at offset 0x{offset:x}" if offset is not None else ''
+        super().__init__(f"[{component}] {reason}{where}")
+
+    def __reduce__(self):
+        # keep the structured fields when raised in a worker process
+        return type(self), (self.component, self.reason, self.offset)
+
+    def as_dict(self) -> dict:
+        return {
+            'kind': self.kind,
+            'component': self.component,
+            'reason': self.reason,
+            'offset': self.offset,
+        }
+
+
+class MalformedPackageError(PackageError):
+    """The input violates the ZIP, AXML or DEX format (truncated, out-of-range, corrupt)."""
+
+    kind = 'malformed'
+
+
+class BudgetExceededError(PackageError):
+    """Processing the package exceeded its time or memory budget."""
+
+    kind = 'budget'
+
+
+class ExtractionCancelledError(PackageError):
+    """The caller cancelled the extraction while it was running."""
+
+    kind = 'cancelled'
+
+
+class Budget:
+    """Per-package limits checked cooperatively by the readers and parsers.
+
+    seconds bounds wall time from construction; max_bytes bounds the total number
+    of bytes read or decompressed into memory for the package. None disables a
+    limit. cancel is any event-like object (threading.Event, a multiprocessing
+    Manager Event); once it is set the next check raises.
+    """
+
+    def __init__(self, seconds: float | None = None, max_bytes: int | None = None, cancel=None):
+        self.seconds = seconds
+        self.deadline = time.monotonic() + seconds if seconds is not None else None
+        self.max_bytes = max_bytes
+        self.used_bytes = 0
+        self.cancel = cancel
+
+    def check(self, component: str) -> None:
+        """Raise ExtractionCancelledError if cancelled, BudgetExceededError once the deadline has passed."""
+        if self.cancel is not None and self.cancel.is_set():
+            raise ExtractionCancelledError(component, "cancelled")
+        if self.deadline is not None and time.monotonic() > self.deadline:
+            raise BudgetExceededError(component, f"time budget of {self.seconds:g}s exceeded")
+
+    def charge(self, n_bytes: int, component: str) -> None:
+        """Account for n_bytes about to be loaded; raise if the memory budget is exceeded."""
+        self.used_bytes += n_bytes
+        if self.max_bytes is not None and self.used_bytes > self.max_bytes:
+            raise BudgetExceededError(
+                component,
+                f"memory budget of {self.max_bytes} bytes exceeded ({self.used_bytes} requested)",
+            )
@@ -0,0 +1,134 @@
+"""Process-local counters and histograms exported in Prometheus textfile format."""
+import os
+import tempfile
+import threading
+
+NAMESPACE = "crunchyroll_extractor"
+
+# Latency buckets in seconds (phases range from sub-millisecond manifest parsing
+# to multi-second scans of large bundles).
+DEFAULT_BUCKETS: tuple[float, ...] = (
+    0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0,
+)
+
+_HELP: dict[str, str] = {
+    'packages_processed_total': "Packages processed, by result.",
+    'bytes_inflated_total':     "Bytes decompressed from packages (manifest + DEX).",
+    'dex_files_scanned_total':  "DEX files handed to the scanner.",
+    'methods_scanned_total':    "Methods with a code item walked by the scanner.",
+    'code_bytes_scanned_total': "Bytecode bytes walked by the scanner.",
+    'classes_skipped_total':    "Classes pruned by the scan scope filters before decoding.",
+    'dex_files_rejected_total': "DEX files rejected by the raw-byte pre-screen before parsing.",
+    'methods_pruned_total':     "Methods not decoded because they could not beat the mobile ranking.",
+    'phase_duration_seconds':   "Wall time per pipeline phase.",
+}
+
+_LabelKey = tuple[tuple[str, str], ...]
+
+
+def _escape(v: str) -> str:
+    return v.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _fmt_labels(labels: _LabelKey, extra: tuple[tuple[str, str], ...] = ()) -> str:
+    items = labels + extra
+    if not items:
+        return ''
+    return '{' + ','.join(f'{k}="{_escape(str(v))}"' for k, v in items) + '}'
+
+
+def _fmt_value(v: float) -> str:
+    return str(int(v)) if float(v).is_integer() else repr(float(v))
+
+
+class _Histogram:
+    __slots__ = ('buckets', 'counts', 'total', 'count')
+
+    def __init__(self, buckets: tuple[float, ...]):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        for i, le in enumerate(self.buckets):
+            if value <= le:
+                self.counts[i] += 1
+                break
+        self.total += value
+        self.count += 1
+
+
+class Metrics:
+    """Counters and histograms keyed by name and labels.
+
+    Updates are a dict lookup and an add under a lock; callers in hot loops
+    accumulate locally and report once per DEX file rather than per method.
+    """
+
+    def __init__(self, namespace: str = NAMESPACE, buckets: tuple[float, ...] = DEFAULT_BUCKETS):
+        self._ns = namespace
+        self._buckets = buckets
+        self._lock = threading.Lock()
+        self._counters: dict[str, dict[_LabelKey, float]] = {}
+        self._histograms: dict[str, dict[_LabelKey, _Histogram]] = {}
+
+    def inc(self, name: str, value: float = 1, **labels: str) -> None:
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            series = self._counters.setdefault(name, {})
+            series[key] = series.get(key, 0) + value
+
+    def observe(self, name: str, value: float, **labels: str) -> None:
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            series = self._histograms.setdefault(name, {})
+            hist = series.get(key)
+            if hist is None:
+                hist = series[key] = _Histogram(self._buckets)
+            hist.observe(value)
+
+    def value(self, name: str, **labels: str) -> float:
+        """Return the current value of a counter series (0 if never incremented)."""
+        with self._lock:
+            return self._counters.get(name, {}).get(tuple(sorted(labels.items())), 0)
+
+    def render(self) -> str:
+        """Return all series in the Prometheus text exposition format."""
+        lines: list[str] = []
+        with self._lock:
+            for name in sorted(self._counters):
+                full = f"{self._ns}_{name}"
+                lines.append(f"# HELP {full} {_HELP.get(name, name)}")
+                lines.append(f"# TYPE {full} counter")
+                for key, v in sorted(self._counters[name].items()):
+                    lines.append(f"{full}{_fmt_labels(key)} {_fmt_value(v)}")
+            for name in sorted(self._histograms):
+                full = f"{self._ns}_{name}"
+                lines.append(f"# HELP {full} {_HELP.get(name, name)}")
+                lines.append(f"# TYPE {full} histogram")
+                for key, h in sorted(self._histograms[name].items()):
+                    cum = 0
+                    for le, c in zip(h.buckets, h.counts):
+                        cum += c
+                        lines.append(f"{full}_bucket{_fmt_labels(key, (('le', repr(le)),))} {cum}")
+                    lines.append(f"{full}_bucket{_fmt_labels(key, (('le', '+Inf'),))} {h.count}")
+                    lines.append(f"{full}_sum{_fmt_labels(key)} {_fmt_value(h.total)}")
+                    lines.append(f"{full}_count{_fmt_labels(key)} {h.count}")
+        return '\n'.join(lines) + '\n'
+
+    def write_textfile(self, path: str) -> None:
+        """Atomically replace path with the current metrics (textfile-collector safe)."""
+        directory = os.path.dirname(os.path.abspath(path))
+        fd, tmp = tempfile.mkstemp(prefix='.metrics-', suffix='.tmp', dir=directory)
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as fh:
+                fh.write(self.render())
+            os.chmod(tmp, 0o644)
+            os.replace(tmp, path)
+        except BaseException:
+            try:
+                os.unlink(tmp)
+            except OSError:
+                pass
+            raise
@@ -0,0 +1,108 @@
+"""Output values and files: Basic Auth, User-Agent, latest-*.json and the credential text files."""
+import base64
+import json
+import os
+import time
+
+from .config import TV_USER_AGENT_TEMPLATE, USER_AGENT_TEMPLATE
+
+
+def short_mobile_version(version: str) -> str:
+    """Strip trailing build segment from 4-part version (e.g. 3.91.1.960 → 3.91.1)."""
+    if not version:
+        return version
+    parts = version.split('.')
+    if len(parts) > 3 and all(p.isdigit() for p in parts):
+        return '.'.join(parts[:-1])
+    return version
+
+
+def version_string(mode: str, version_name: str, version_code: str) -> str:
+    """Version string of the User-Agent: versionName (mobile, short form) or versionName_versionCode (TV)."""
+    if mode == 'tv':
+        return f"{version_name}_{version_code}"
+    return short_mobile_version(version_name)
+
+
+def user_agent_for(mode: str, version: str) -> str:
+    return (TV_USER_AGENT_TEMPLATE if mode == 'tv' else USER_AGENT_TEMPLATE).format(version)
+
+
+def basic_auth(client_id: str, secret_id: str) -> str:
+    return base64.b64encode(f"{client_id}:{secret_id}".encode()).decode()
+
+
+def validation_status(validation: dict) -> str:
+    if validation.get('skipped'):
+        return 'SKIPPED'
+    return 'VALID' if validation['valid'] else 'INVALID'
+
+
+def location_class(location: dict | None) -> str | None:
+    """Class descriptor of a reported CredentialLocation ('Lcls;->m()V' → 'Lcls;')."""
+    if not location:
+        return None
+    return location['method'].split('->', 1)[0]
+
+
+def write_json(path: str, data: dict) -> None:
+    with open(path, 'w', encoding='utf-8') as fh:
+        json.dump(data, fh, indent=2)
+
+
+def latest_json(auth: str, user_agent: str, app_version: str, source_class: str | None) -> dict:
+    """Contents of latest-mobile.json / latest-tv.json."""
+    data = {
+        'auth': auth,
+        'user-agent': user_agent,
+        'app-version': app_version,
+    }
+    if source_class:
+        data['source-class'] = source_class
+    return data
+
+
+def write_mobile_credentials(
+    directory: str,
+    client_id: str,
+    secret_id: str,
+    app_version: str,
+    file_size: str,
+    validation: dict,
+) -> str:
+    """Write crunchyroll_credentials_mobile_v<version>.txt and return its path."""
+    path = os.path.join(directory, f"crunchyroll_credentials_mobile_v{app_version}.txt")
+    with open(path, 'w', encoding='utf-8') as fh:
+        fh.write(f"Crunchyroll Version: {app_version}\n")
+        fh.write(f"File Size: {file_size}\n")
+        fh.write(f"Client ID: {client_id}\n")
+        fh.write(f"Secret ID: {secret_id}\n")
+        fh.write(f"Basic Auth: {basic_auth(client_id, secret_id)}\n")
+        fh.write(f"User-Agent: {user_agent_for('mobile', app_version)}\n")
+        fh.write(f"Validation Status: {validation_status(validation)}\n")
+        fh.write(f"Tested At: {time.strftime('%Y-%m-%d %H:%M:%S', time.localtime())}\n")
+    return path
+
+
+def write_tv_credentials(
+    directory: str,
+    client_id: str,
+    secret_id: str,
+    tv_version: str,
+    validation: dict,
+) -> str:
+    """Write crunchyroll_credentials_tv_v<versionName_versionCode>.txt and return its path."""
+    path = os.path.join(directory, f"crunchyroll_credentials_tv_v{tv_version}.txt")
+    with open(path, 'w', encoding='utf-8') as fh:
+        fh.write(f"Crunchyroll TV Version: {tv_version}\n")
+        fh.write(f"Client ID: {client_id}\n")
+        fh.write(f"Secret ID: {secret_id}\n")
+        fh.write(f"Basic Auth: {basic_auth(client_id, secret_id)}\n")
+        fh.write(f"User-Agent: {user_agent_for('tv', tv_version)}\n")
+        fh.write(f"CF_BM Cookie: {validation.get('cf_bm') or 'None'}\n")
+        fh.write(f"Anonymous Access Token Present: {validation.get('anonymous_access_token_present')}\n")
+        fh.write(f"User Code: {validation.get('user_code') or 'None'}\n")
+        fh.write(f"Device Code: {validation.get('device_code') or 'None'}\n")
+        fh.write(f"Validation Status: {validation_status(validation)}\n")
+        fh.write(f"Tested At: {time.strftime('%Y-%m-%d %H:%M:%S', time.localtime())}\n")
+    return path
@@ -0,0 +1,152 @@
+"""Size up a package from ZIP metadata and DEX headers alone, without inflating any DEX body."""
+import io
+import os
+import struct
+import time
+import zipfile
+import zlib
+from typing import BinaryIO, NamedTuple
+
+from .apk_reader import _DEX_HEADER_SIZE, _human_size, _largest_apk_in_zip, _sorted_dex_names
+from .axml_parser import parse_manifest
+from .dex_extractor import _TYPE_CODE_ITEM
+from .limits import PackageError
+from .readahead import _MemberView, _data_offset
+
+
+class DexInfo(NamedTuple):
+    """Counts of one classes*.dex, read from its header and (when stored) its map_list."""
+    name:          str
+    size:          int            # uncompressed bytes
+    compress_size: int
+    stored:        bool
+    strings:       int
+    types:         int
+    protos:        int
+    fields:        int
+    methods:       int
+    class_defs:    int
+    data_size:     int
+    code_items:    int | None     # from the map_list; None when it would need a full inflate
+
+
+class PackageInfo(NamedTuple):
+    path:          str
+    apk_name:      str
+    container:     str | None     # outer archive member layout note, None for a plain APK
+    size:          int
+    manifest:      dict
+    dex:           list[DexInfo]
+    elapsed_s:     float
+
+
+def _code_items(fh: BinaryIO, dex_start: int, header: bytes, size: int) -> int | None:
+    """Count of code_items from the map_list of a stored DEX starting at dex_start."""
+    map_off = struct.unpack_from('<I', header, 0x34)[0]
+    if not map_off or map_off + 4 > size:
+        return None
+    fh.seek(dex_start + map_off)
+    raw = fh.read(4)
+    n = struct.unpack('<I', raw)[0] if len(raw) == 4 else 0
+    if map_off + 4 + n * 12 > size:
+        return None
+    items = fh.read(n * 12)
+    for i in range(n):
+        typ, _unused, count, _off = struct.unpack_from('<HHII', items, i * 12)
+        if typ == _TYPE_CODE_ITEM:
+            return count
+    return 0
+
+
+def _dex_info(apk: zipfile.ZipFile, fh: BinaryIO, name: str) -> DexInfo:
+    info = apk.getinfo(name)
+    with apk.open(info) as member:
+        header = member.read(_DEX_HEADER_SIZE)
+    if len(header) < _DEX_HEADER_SIZE or header[:4] != b'dex\n':
+        return DexInfo(name, info.file_size, info.compress_size, False, 0, 0, 0, 0, 0, 0, 0, None)
+    counts = [struct.unpack_from('<I', header, off)[0] for off in (0x38, 0x40, 0x48, 0x50, 0x58, 0x60, 0x68)]
+    stored = info.compress_type == zipfile.ZIP_STORED
+    code_items = _code_items(fh, _data_offset(fh, info), header, info.file_size) if stored else None
+    return DexInfo(name, info.file_size, info.compress_size, stored, *counts, code_items)
+
+
+def _inspect_apk(fh: BinaryIO) -> tuple[dict, list[DexInfo]]:
+    with zipfile.ZipFile(fh) as apk:
+        names = apk.namelist()
+        manifest = parse_manifest(apk.read('AndroidManifest.xml')) if 'AndroidManifest.xml' in names else {}
+        return manifest, [_dex_info(apk, fh, n) for n in _sorted_dex_names(names)]
+
+
+def inspect_package(path: str) -> PackageInfo | None:
+    """Read manifest fields and per-DEX counts of an APK, container or directory of APKs.
+
+    Only the central directories, the manifest, each DEX header and (for DEX
+    members stored uncompressed) the map_list are read. An APK stored inside a
+    container is opened in place; a compressed one has to be inflated first.
+    """
+    t0 = time.perf_counter()
+    if os.path.isdir(path):
+        apks = [os.path.join(root, f) for root, _d, files in os.walk(path) for f in files
+                if f.lower().endswith('.apk')]
+        if not apks:
+            print("[inspect] No APK found in directory.")
+            return None
+        path = max(apks, key=os.path.getsize)
+
+    try:
+        size = os.path.getsize(path)
+        fh = open(path, 'rb')
+    except OSError as e:
+        print(f"[inspect] Cannot open package: {e}")
+        return None
+    with fh:
+        try:
+            with zipfile.ZipFile(fh) as outer:
+                is_apk = 'AndroidManifest.xml' in outer.namelist()
+                inner = None if is_apk else ('base.apk' if 'base.apk' in outer.namelist()
+                                             else _largest_apk_in_zip(outer))
+                inner_info = outer.getinfo(inner) if inner else None
+                if not is_apk and inner_info is None:
+                    print("[inspect] No APK found inside container.")
+                    return None
+                if inner_info is not None and inner_info.compress_type != zipfile.ZIP_STORED:
+                    apk_bytes = outer.read(inner_info)
+            if is_apk:
+                manifest, dex = _inspect_apk(fh)
+                container = None
+            elif inner_info.compress_type == zipfile.ZIP_STORED:
+                view = io.BufferedReader(_MemberView(fh, _data_offset(fh, inner_info), inner_info.file_size))
+                manifest, dex = _inspect_apk(view)
+                container = f"{inner} stored, read in place"
+            else:
+                manifest, dex = _inspect_apk(io.BytesIO(apk_bytes))
+                container = f"{inner} compressed, inflated {_human_size(inner_info.file_size)}"
+        except (zipfile.BadZipFile, struct.error, KeyError, zlib.error, OSError, PackageError) as e:
+            print(f"[inspect] Not a readable APK/container: {e}")
+            return None
+
+    apk_name = os.path.basename(path) if container is None else inner
+    return PackageInfo(path, apk_name, container, size, manifest, dex, time.perf_counter() - t0)
+
+
+def print_inspection(info: PackageInfo) -> None:
+    print(f"=== {os.path.basename(info.path)} ({_human_size(info.size)}) ===")
+    if info.container:
+        print(f"  Container   : {info.container}")
+    print(f"  versionName : {info.manifest.get('versionName')}")
+    print(f"  versionCode : {info.manifest.get('versionCode')}")
+    print(f"  Android TV  : {info.manifest.get('is_tv')}")
+    print()
+    print(f"  {'DEX':<14} {'size':>10} {'packed':>10} {'strings':>8} {'types':>7} {'protos':>7} "
+          f"{'fields':>7} {'methods':>8} {'classes':>8} {'code':>8} {'data':>10}")
+    for d in info.dex:
+        code = str(d.code_items) if d.code_items is not None else '-'
+        print(f"  {d.name:<14} {d.size:>10} {d.compress_size if not d.stored else 'stored':>10} "
+              f"{d.strings:>8} {d.types:>7} {d.protos:>7} {d.fields:>7} {d.methods:>8} {d.class_defs:>8} "
+              f"{code:>8} {d.data_size:>10}")
+    total = sum(d.size for d in info.dex)
+    print(f"\n  {len(info.dex)} DEX, {_human_size(total)} uncompressed, "
+          f"{sum(d.methods for d in info.dex)} method ids, {sum(d.class_defs for d in info.dex)} classes")
+    if any(d.code_items is None for d in info.dex):
+        print("  (code item counts are only read for DEX members stored uncompressed)")
+    print(f"  Inspected in {info.elapsed_s * 1000:.1f} ms")
@@ -0,0 +1,215 @@
+"""Choose the DEX scan strategy for a package from its size and a one-time local calibration."""
+import json
+import multiprocessing
+import os
+import struct
+import time
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import asdict, dataclass
+from typing import Callable, NamedTuple
+
+from .config import PLANNER_CALIBRATION_FILE, SHARD_MIN_CLASS_DEFS
+
+CALIBRATION_VERSION = 1
+
+# Typical share of an app DEX taken by code_items; the header does not record
+# it and the map_list sits at the end of the (possibly not yet inflated) file.
+_CODE_FRACTION = 0.4
+
+
+def can_start_workers() -> bool:
+    """False in a daemonic process (e.g. a multiprocessing.Pool worker), which may not have children."""
+    return not multiprocessing.current_process().daemon
+
+
+def available_cpus() -> int:
+    """CPUs this process may run on (affinity-aware where the platform supports it)."""
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+@dataclass
+class Calibration:
+    """Measured costs of the scan building blocks on this machine."""
+    version:             int
+    code_bytes_per_s:    float    # const-string walk over instructions
+    strings_per_s:       float    # string pool decode
+    inflate_bytes_per_s: float    # zlib inflate of DEX-like data
+    pool_startup_s:      float    # start a 2-process pool and run one task
+    task_roundtrip_s:    float    # submit/collect one task on a warm pool
+
+
+def _noop() -> None:
+    return None
+
+
+def _synthetic_insns(n_bytes: int) -> bytes:
+    # const-string v0, #i ; move v1, v0 ; ... – one string ref per 8 bytes
+    unit = bytearray()
+    for i in range(n_bytes // 8):
+        unit += bytes((0x1A, 0)) + struct.pack('<H', i & 0xFFFF) + b'\x01\x10\x00\x00'
+    return bytes(unit)
+
+
+def _synthetic_string_pool(n: int) -> bytes:
+    """A minimal buffer that _extract_strings accepts: header, string_ids, string data."""
+    data = bytearray()
+    offsets = []
+    base = 0x70 + 4 * n
+    for i in range(n):
+        s = f"Lcom/example/pkg{i % 97}/Class{i};".encode()
+        offsets.append(base + len(data))
+        data += bytes((len(s),)) + s + b'\x00'
+    header = bytearray(0x70)
+    header[:4] = b'dex\n'
+    struct.pack_into('<II', header, 0x38, n, 0x70)
+    return bytes(header) + struct.pack(f'<{n}I', *offsets) + bytes(data)
+
+
+def _rate(func, units: float, min_time: float = 0.05) -> float:
+    """Units per second of func, repeating until at least min_time has elapsed."""
+    runs = 0
+    t0 = time.perf_counter()
+    while True:
+        func()
+        runs += 1
+        elapsed = time.perf_counter() - t0
+        if elapsed >= min_time:
+            return units * runs / elapsed
+
+
+def calibrate(measure_pool: bool = True) -> Calibration:
+    """Time the scan building blocks on synthetic data (well under a second).
+
+    With measure_pool=False the process pool costs are not measured and left at 0;
+    such a calibration is only good for serial plans.
+    """
+    from .dex_extractor import _extract_strings, _scan_code_item
+
+    insns = _synthetic_insns(1 << 20)
+    pool = _synthetic_string_pool(20000)
+    raw = insns + pool
+    packed = zlib.compress(raw, 6)
+
+    pool_startup = roundtrip = 0.0
+    if measure_pool:
+        t0 = time.perf_counter()
+        with ProcessPoolExecutor(max_workers=2) as executor:
+            executor.submit(_noop).result()
+            pool_startup = time.perf_counter() - t0
+            t1 = time.perf_counter()
+            for _ in range(10):
+                executor.submit(_noop).result()
+            roundtrip = (time.perf_counter() - t1) / 10
+
+    return Calibration(
+        version=CALIBRATION_VERSION,
+        code_bytes_per_s=_rate(lambda: _scan_code_item(insns, 1 << 16), len(insns)),
+        strings_per_s=_rate(lambda: _extract_strings(pool), 20000),
+        inflate_bytes_per_s=_rate(lambda: zlib.decompress(packed), len(raw)),
+        pool_startup_s=pool_startup,
+        task_roundtrip_s=roundtrip,
+    )
+
+
+def load_calibration(
+    path: str = PLANNER_CALIBRATION_FILE,
+    log: Callable[[str], None] | None = None,
+) -> Calibration:
+    """Return the stored calibration, measuring and storing it on first use.
+
+    A daemonic process cannot start the pool to measure, so there the serial
+    costs are measured for this call only and nothing is stored.
+    """
+    try:
+        with open(path, encoding='utf-8') as fh:
+            data = json.load(fh)
+        if data.get('version') == CALIBRATION_VERSION:
+            return Calibration(**data)
+    except (OSError, ValueError, TypeError):
+        pass
+
+    if not can_start_workers():
+        return calibrate(measure_pool=False)
+    if log is not None:
+        log("[planner] Calibrating scan costs (one-time) …")
+    cal = calibrate()
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, 'w', encoding='utf-8') as fh:
+        json.dump(asdict(cal), fh, indent=2)
+    os.replace(tmp, path)
+    return cal
+
+
+class DexShape(NamedTuple):
+    """What the planner knows about one DEX before it is inflated."""
+    size:       int    # uncompressed bytes
+    n_strings:  int
+    n_classes:  int
+
+
+def dex_shape(size: int, header: bytes) -> DexShape:
+    """Read the string_ids and class_defs counts from a DEX header prefix."""
+    if len(header) < 0x70 or header[:4] != b'dex\n':
+        return DexShape(size, 0, 0)
+    n_strings = struct.unpack_from('<I', header, 0x38)[0]
+    n_classes = struct.unpack_from('<I', header, 0x60)[0]
+    return DexShape(size, n_strings, n_classes)
+
+
+class ScanPlan(NamedTuple):
+    """How to scan one package, with the time the calibration predicts for it."""
+    workers:     int      # processes for class_def shards (1 = no pool)
+    backend:     str      # 'serial' | 'sharded'
+    loading:     str      # 'eager' (inflate all DEX first) | 'pipelined'
+    predicted_s: float    # predicted inflate + scan time
+
+    def describe(self) -> str:
+        return f"backend={self.backend} workers={self.workers} loading={self.loading}"
+
+
+def _predict(shapes: list[DexShape], cal: Calibration, workers: int, pool_running: bool, loading: str) -> float:
+    scan = 0.0
+    for d in shapes:
+        code = d.size * _CODE_FRACTION / cal.code_bytes_per_s
+        strings = d.n_strings / cal.strings_per_s
+        if workers > 1 and d.n_classes >= SHARD_MIN_CLASS_DEFS:
+            code = code / workers + workers * cal.task_roundtrip_s
+        scan += strings + code
+    if workers > 1 and not pool_running and any(d.n_classes >= SHARD_MIN_CLASS_DEFS for d in shapes):
+        scan += cal.pool_startup_s
+
+    inflate = [d.size / cal.inflate_bytes_per_s for d in shapes]
+    if loading == 'eager' or not inflate:
+        return sum(inflate) + scan
+    # the producer thread inflates DEX n+1 while DEX n is scanned
+    return inflate[0] + max(scan, sum(inflate[1:]))
+
+
+def plan_scan(
+    shapes: list[DexShape],
+    cal: Calibration,
+    *,
+    cpus: int,
+    workers: int | None = None,
+    pool_running: bool = False,
+) -> ScanPlan:
+    """Pick the cheapest worker count and loading mode for a package.
+
+    workers fixes the worker count (e.g. from --workers); otherwise every
+    count up to cpus is costed. Pipelining only pays off with more than one DEX
+    to overlap, so a single DEX is inflated eagerly.
+    """
+    loading = 'pipelined' if len(shapes) > 1 else 'eager'
+    candidates = [workers] if workers else range(1, max(1, cpus) + 1)
+    best: ScanPlan | None = None
+    for w in candidates:
+        predicted = _predict(shapes, cal, w, pool_running, loading)
+        if best is None or predicted < best.predicted_s:
+            shardable = w > 1 and any(d.n_classes >= SHARD_MIN_CLASS_DEFS for d in shapes)
+            best = ScanPlan(w, 'sharded' if shardable else 'serial', loading, predicted)
+    return best
@@ -0,0 +1,82 @@
+"""Profile a pipeline run: cProfile statistics plus sampled, flamegraph-ready stacks."""
+import collections
+import cProfile
+import os
+import pstats
+import sys
+import threading
+import time
+
+SAMPLE_INTERVAL = 0.001   # seconds between stack samples
+TOP_FUNCTIONS = 15
+
+
+class _StackSampler(threading.Thread):
+    """Sample one thread's Python stack at a fixed interval and count collapsed stacks."""
+
+    def __init__(self, thread_id: int, interval: float = SAMPLE_INTERVAL):
+        super().__init__(name='stack-sampler', daemon=True)
+        self._thread_id = thread_id
+        self._interval = interval
+        self._stop_event = threading.Event()
+        self.stacks: collections.Counter[str] = collections.Counter()
+
+    def run(self) -> None:
+        while not self._stop_event.wait(self._interval):
+            frame = sys._current_frames().get(self._thread_id)
+            frames: list[str] = []
+            while frame is not None:
+                code = frame.f_code
+                frames.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+                frame = frame.f_back
+            if frames:
+                self.stacks[';'.join(reversed(frames))] += 1
+
+    def stop(self) -> None:
+        self._stop_event.set()
+        self.join()
+
+
+def _write_collapsed(path: str, stacks: collections.Counter) -> None:
+    with open(path, 'w', encoding='utf-8') as fh:
+        for stack, count in sorted(stacks.items()):
+            fh.write(f"{stack} {count}\n")
+
+
+def _print_hot_functions(stats: pstats.Stats, top: int) -> None:
+    total = stats.total_tt or 1e-9
+    rows = sorted(stats.stats.items(), key=lambda kv: kv[1][2], reverse=True)[:top]
+    print(f"\n=== PROFILE: TOP {len(rows)} FUNCTIONS BY OWN TIME (total {stats.total_tt:.3f}s) ===")
+    print(f"  {'share':>6}  {'own':>8}  {'cumul':>8}  {'calls':>9}  function")
+    for (filename, line, name), (_cc, nc, tt, ct, _callers) in rows:
+        where = f"{os.path.basename(filename)}:{line}" if line else filename
+        print(f"  {tt / total * 100:5.1f}%  {tt:7.3f}s  {ct:7.3f}s  {nc:>9}  {name} ({where})")
+
+
+def profile_call(func, *args, out_prefix: str, top: int = TOP_FUNCTIONS, **kwargs):
+    """Call func under cProfile and a stack sampler; write <prefix>.pstats and <prefix>.collapsed.
+
+    Only the calling thread is profiled. Returns whatever func returns.
+    """
+    sampler = _StackSampler(threading.get_ident())
+    profiler = cProfile.Profile()
+    sampler.start()
+    t0 = time.perf_counter()
+    profiler.enable()
+    try:
+        return func(*args, **kwargs)
+    finally:
+        profiler.disable()
+        elapsed = time.perf_counter() - t0
+        sampler.stop()
+
+        pstats_path = f"{out_prefix}.pstats"
+        collapsed_path = f"{out_prefix}.collapsed"
+        stats = pstats.Stats(profiler)
+        stats.dump_stats(pstats_path)
+        _write_collapsed(collapsed_path, sampler.stacks)
+
+        _print_hot_functions(stats, top)
+        print(f"\nProfiled wall time : {elapsed:.3f}s ({sum(sampler.stacks.values())} stack samples)")
+        print(f"pstats             : {pstats_path}")
+        print(f"Collapsed stacks   : {collapsed_path}")
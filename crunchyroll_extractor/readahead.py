@@ -0,0 +1,207 @@
+"""Fetch the compressed bytes of selected ZIP members in file order, with readahead hints.
+
+zipfile reads members one at a time in the order asked, each with its own seek
+and small reads. Here the wanted members are sorted by local-header offset,
+neighbours are merged into spans, the kernel is told about every span at once
+(posix_fadvise WILLNEED) and each span is then fetched with one sequential read.
+Inflating is left to the caller.
+"""
+import io
+import os
+import struct
+import zipfile
+from typing import BinaryIO, Callable, NamedTuple
+
+from .config import READAHEAD_MAX_GAP
+from .limits import Budget, MalformedPackageError
+
+_LOCAL_HEADER = struct.Struct('<4s22xHH')     # signature … file name length, extra field length
+_END_RECORD   = struct.Struct('<4s8xII2x')    # signature … central directory size and offset, comment length
+_END_RECORD64 = struct.Struct('<4s36xQQ')     # signature … central directory size and offset
+_END_LOCATOR64_SIZE = 20
+_MAX_COMMENT = 0xFFFF
+
+
+class _MemberView(io.RawIOBase):
+    """Seekable read-only window over a stored ZIP member's bytes in the outer file."""
+
+    def __init__(self, fh: BinaryIO, start: int, size: int):
+        self._fh = fh
+        self._start = start
+        self._size = size
+        self._pos = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def tell(self) -> int:
+        return self._pos
+
+    def seek(self, offset: int, whence: int = os.SEEK_SET) -> int:
+        base = {os.SEEK_SET: 0, os.SEEK_CUR: self._pos, os.SEEK_END: self._size}[whence]
+        self._pos = max(0, base + offset)
+        return self._pos
+
+    def readinto(self, buf) -> int:
+        n = max(0, min(len(buf), self._size - self._pos))
+        self._fh.seek(self._start + self._pos)
+        data = self._fh.read(n)
+        buf[:len(data)] = data
+        self._pos += len(data)
+        return len(data)
+
+
+def _data_offset(fh: BinaryIO, info: zipfile.ZipInfo) -> int:
+    """Offset of a member's (compressed) bytes: after its local header, whose lengths may differ from the CD."""
+    fh.seek(info.header_offset)
+    sig, name_len, extra_len = _LOCAL_HEADER.unpack(fh.read(_LOCAL_HEADER.size))
+    if sig != b'PK\x03\x04':
+        raise zipfile.BadZipFile(f"{info.filename}: bad local file header")
+    return info.header_offset + _LOCAL_HEADER.size + name_len + extra_len
+
+
+def _central_directory_start(fh: BinaryIO, base: int, size: int) -> int:
+    """Offset of the central directory in the archive, from the end of central directory record.
+
+    This is where the last member's bytes end. It is taken as the record's
+    position minus the directory size (the ZIP64 record's when present), which
+    also holds when data was prepended to the archive.
+    """
+    tail_len = min(size, _END_RECORD.size + _MAX_COMMENT)
+    fh.seek(base + size - tail_len)
+    tail = fh.read(tail_len)
+    at = len(tail) - _END_RECORD.size
+    if at < 0 or tail[at:at + 4] != b'PK\x05\x06':
+        at = tail.rfind(b'PK\x05\x06', 0, max(at, 0))
+    if at < 0:
+        raise MalformedPackageError('zip', "end of central directory record not found")
+    _, cd_size, _ = _END_RECORD.unpack_from(tail, at)
+    end = size - tail_len + at
+    if end >= _END_LOCATOR64_SIZE + _END_RECORD64.size:
+        fh.seek(base + end - _END_LOCATOR64_SIZE)
+        if fh.read(4) == b'PK\x06\x07':
+            # a ZIP64 locator: the ZIP64 record right before it holds the real size
+            end -= _END_LOCATOR64_SIZE + _END_RECORD64.size
+            fh.seek(base + end)
+            sig, cd_size, _ = _END_RECORD64.unpack(fh.read(_END_RECORD64.size))
+            if sig != b'PK\x06\x06':
+                raise MalformedPackageError('zip', "bad ZIP64 end of central directory record", end)
+    if cd_size > end:
+        raise MalformedPackageError('zip', "central directory runs past its end record", end)
+    return end - cd_size
+
+
+class PackedMember(NamedTuple):
+    info: zipfile.ZipInfo
+    data: memoryview          # compressed bytes, as stored in the archive
+
+
+class Span(NamedTuple):
+    """Byte range of the archive fetched with one read, and the wanted members inside it."""
+    start:   int
+    end:     int
+    members: list[zipfile.ZipInfo]
+
+
+class MemberRead(NamedTuple):
+    members:    dict[str, PackedMember]
+    spans:      list[Span]
+    bytes_read: int
+    readahead:  bool          # posix_fadvise hints were issued
+
+
+def plan_spans(
+    infos: list[zipfile.ZipInfo], wanted: set[str], end_of_entries: int, max_gap: int = READAHEAD_MAX_GAP,
+) -> list[Span]:
+    """Group the wanted members, in local-header order, into spans separated by more than max_gap.
+
+    A member ends where the next local header (or the central directory)
+    starts, which covers local extra fields (zipalign padding) and data
+    descriptors that the central directory does not describe.
+    """
+    ordered = sorted(infos, key=lambda i: i.header_offset)
+    spans: list[Span] = []
+    for n, info in enumerate(ordered):
+        if info.filename not in wanted:
+            continue
+        end = ordered[n + 1].header_offset if n + 1 < len(ordered) else end_of_entries
+        if end < info.header_offset:
+            raise MalformedPackageError('zip', f"{info.filename}: member overlaps the central directory",
+                                        info.header_offset)
+        if spans and info.header_offset - spans[-1].end <= max_gap:
+            last = spans[-1]
+            spans[-1] = Span(last.start, end, last.members + [info])
+        else:
+            spans.append(Span(info.header_offset, end, [info]))
+    return spans
+
+
+def _advise(fd: int | None, base: int, spans: list[Span]) -> bool:
+    if fd is None or not hasattr(os, 'posix_fadvise'):
+        return False
+    try:
+        for span in spans:
+            os.posix_fadvise(fd, base + span.start, span.end - span.start, os.POSIX_FADV_WILLNEED)
+    except OSError:
+        return False
+    return True
+
+
+def _unpack(buf: memoryview, span: Span) -> dict[str, PackedMember]:
+    members = {}
+    for info in span.members:
+        at = info.header_offset - span.start
+        if at + _LOCAL_HEADER.size > len(buf):
+            raise MalformedPackageError('zip', f"{info.filename}: local header past end of file", info.header_offset)
+        sig, name_len, extra_len = _LOCAL_HEADER.unpack_from(buf, at)
+        if sig != b'PK\x03\x04':
+            raise MalformedPackageError('zip', f"{info.filename}: bad local file header", info.header_offset)
+        start = at + _LOCAL_HEADER.size + name_len + extra_len
+        if start + info.compress_size > len(buf):
+            raise MalformedPackageError('zip', f"{info.filename}: compressed data runs past its member",
+                                        info.header_offset)
+        members[info.filename] = PackedMember(info, buf[start:start + info.compress_size])
+    return members
+
+
+def read_members(
+    fh: BinaryIO,
+    want: Callable[[str], bool],
+    *,
+    base: int = 0,
+    size: int | None = None,
+    fd: int | None = None,
+    budget: Budget | None = None,
+    max_gap: int = READAHEAD_MAX_GAP,
+) -> MemberRead:
+    """Read the compressed bytes of every member whose name satisfies want.
+
+    The archive is the size bytes of fh starting at base (the whole file by
+    default), so an APK stored uncompressed inside a container is read in
+    place. fd enables the readahead hints; without it (pipes, spooled input)
+    the spans are still read in order.
+    """
+    if size is None:
+        size = fh.seek(0, os.SEEK_END) - base
+    with zipfile.ZipFile(io.BufferedReader(_MemberView(fh, base, size))) as zf:
+        infos = zf.infolist()
+    end_of_entries = _central_directory_start(fh, base, size)
+    wanted = {i.filename for i in infos if want(i.filename)}
+    spans = plan_spans(infos, wanted, end_of_entries, max_gap)
+    readahead = _advise(fd, base, spans)
+
+    members: dict[str, PackedMember] = {}
+    bytes_read = 0
+    for span in spans:
+        length = span.end - span.start
+        if budget is not None:
+            budget.check('zip')
+            budget.charge(length, 'zip')
+        fh.seek(base + span.start)
+        buf = fh.read(length)       # not readinto: SpooledTemporaryFile lacks it before 3.11
+        bytes_read += len(buf)
+        members.update(_unpack(memoryview(buf), span))
+    return MemberRead(members, spans, bytes_read, readahead)
@@ -0,0 +1,158 @@
+"""Split a batch of packages across machines and merge the per-shard result files."""
+import hashlib
+import json
+import os
+import socket
+import time
+
+
+def parse_shard(spec: str) -> tuple[int, int]:
+    """Parse 'i/N' (1 <= i <= N). Raises ValueError on anything else."""
+    try:
+        i, n = (int(p) for p in spec.split('/'))
+    except ValueError:
+        raise ValueError(f"--shard expects i/N, got {spec!r}") from None
+    if not 1 <= i <= n:
+        raise ValueError(f"--shard {spec}: i must be between 1 and N")
+    return i, n
+
+
+def shard_of(package_path: str, n_shards: int) -> int:
+    """Return the 1-based shard of a package: a stable hash of its file name.
+
+    Only the base name is hashed, so machines that mount the archive at
+    different paths still agree on the split.
+    """
+    name = os.path.basename(os.path.normpath(package_path))
+    digest = hashlib.sha1(name.encode('utf-8')).digest()
+    return int.from_bytes(digest[:8], 'big') % n_shards + 1
+
+
+def select_shard(paths: list[str], shard: int, n_shards: int) -> list[str]:
+    return [p for p in paths if shard_of(p, n_shards) == shard]
+
+
+def default_results_path(directory: str, shard: int, n_shards: int) -> str:
+    return os.path.join(directory, f"results-shard-{shard}-of-{n_shards}.json")
+
+
+class ShardResults:
+    """Per-shard result file, rewritten atomically after every package."""
+
+    def __init__(self, path: str, shard: int, n_shards: int, n_packages: int):
+        self.path = path
+        self._data = {
+            'shard': shard,
+            'n_shards': n_shards,
+            'host': socket.gethostname(),
+            'started_at': time.time(),
+            'finished_at': None,
+            'n_packages': n_packages,
+            'packages': [],
+        }
+
+    def add(self, record: dict) -> None:
+        self._data['packages'].append(record)
+        self._write()
+
+    def finish(self) -> None:
+        self._data['finished_at'] = time.time()
+        self._write()
+
+    def _write(self) -> None:
+        tmp = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp, 'w', encoding='utf-8') as fh:
+            json.dump(self._data, fh, indent=2)
+        os.replace(tmp, self.path)
+
+
+def _record_key(rec: dict) -> str:
+    """Identity of a result record: its package path (the file name is only a label)."""
+    path = rec.get('path')
+    return os.path.normpath(path) if path and path != '-' else rec['package']
+
+
+def merge_results(paths: list[str]) -> dict:
+    """Combine shard result files into one report ordered by package name, then path.
+
+    The report lists every package path once (a later file wins on
+    duplicates), so same-named packages from different directories are kept
+    apart; it also lists which shards were seen or are missing, and
+    per-phase timing aggregates.
+    """
+    shards: dict[int, dict] = {}
+    packages: dict[str, dict] = {}
+    n_shards = None
+    warnings: list[str] = []
+    for path in paths:
+        with open(path, encoding='utf-8') as fh:
+            data = json.load(fh)
+        if n_shards is None:
+            n_shards = data['n_shards']
+        elif data['n_shards'] != n_shards:
+            warnings.append(f"{path}: shard count {data['n_shards']} != {n_shards}")
+        if data['finished_at'] is None:
+            warnings.append(f"{path}: shard {data['shard']} did not finish")
+        shards[data['shard']] = {
+            'file': path,
+            'host': data['host'],
+            'packages': len(data['packages']),
+            'expected': data['n_packages'],
+            'wall_time': (data['finished_at'] or time.time()) - data['started_at'],
+        }
+        for rec in data['packages']:
+            key = _record_key(rec)
+            if key in packages:
+                warnings.append(f"{key}: present in more than one shard file")
+            packages[key] = rec
+
+    missing = sorted(set(range(1, (n_shards or 0) + 1)) - set(shards))
+    if missing:
+        warnings.append(f"missing shard(s): {', '.join(map(str, missing))}")
+
+    ordered = [packages[key] for key in sorted(packages, key=lambda k: (packages[k]['package'], k))]
+    phases: dict[str, list[float]] = {}
+    for rec in ordered:
+        for phase, seconds in (rec.get('timings') or {}).items():
+            phases.setdefault(phase, []).append(seconds)
+    totals = [rec['total'] for rec in ordered if rec.get('total') is not None]
+
+    return {
+        'n_shards': n_shards,
+        'shards': {str(k): shards[k] for k in sorted(shards)},
+        'warnings': warnings,
+        'summary': {
+            'packages': len(ordered),
+            'succeeded': sum(1 for rec in ordered if rec.get('ok')),
+            'total_seconds': round(sum(totals), 4),
+            'max_seconds': round(max(totals), 4) if totals else None,
+            'phases': {
+                phase: {
+                    'sum': round(sum(v), 4),
+                    'mean': round(sum(v) / len(v), 4),
+                    'max': round(max(v), 4),
+                }
+                for phase, v in sorted(phases.items())
+            },
+        },
+        'packages': ordered,
+    }
+
+
+def print_report(report: dict) -> None:
+    summary = report['summary']
+    print(f"=== MERGED REPORT: {summary['packages']} package(s) from {len(report['shards'])} shard(s) ===")
+    names = [rec['package'] for rec in report['packages']]
+    for rec in report['packages']:
+        # the file name labels a package unless another directory holds one of the same name
+        label = rec['package'] if names.count(rec['package']) == 1 else _record_key(rec)
+        status = rec.get('client_id') or (rec.get('error') or {}).get('reason') or 'no credentials'
+        total = f"{rec['total']:.2f}s" if rec.get('total') is not None else '-'
+        print(f"  {label:<40} {'ok' if rec.get('ok') else 'FAILED':<6} {total:>8}  {status}")
+    print()
+    for phase, agg in summary['phases'].items():
+        print(f"  {phase:<9} sum {agg['sum']:>9.3f}s  mean {agg['mean']:>8.3f}s  max {agg['max']:>8.3f}s")
+    print(f"\nSucceeded: {summary['succeeded']}/{summary['packages']}, "
+          f"total {summary['total_seconds']:.2f}s of package time")
+    for w in report['warnings']:
+        print(f"  WARNING: {w}")
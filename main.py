@@ -4,6 +4,7 @@ import json
 import os
 import sys
 import time
+from dataclasses import dataclass, field
 
 try:
     import tkinter as tk
@@ -16,36 +17,83 @@ from crunchyroll_extractor.config import (
     PROJECT_ROOT,
     OUTPUT_JSON_FILENAME_TV,
     OUTPUT_JSON_FILENAME_MOBILE,
-    USER_AGENT_TEMPLATE,
-    TV_USER_AGENT_TEMPLATE,
+    DEX_PIPELINE_DEPTH,
+    SCAN_WORKERS,
+    MOBILE_TOP_K,
+    PACKAGE_TIME_BUDGET_S,
+    PACKAGE_MEMORY_BUDGET_BYTES,
+    CATALOG_BATCH_SIZE,
+    SCAN_HISTORY_FILE,
 )
-from crunchyroll_extractor.apk_reader import load_package
-from crunchyroll_extractor.axml_parser import parse_manifest
+from crunchyroll_extractor.api import PreviousResult, describe_error, extract
+from crunchyroll_extractor.catalog import Catalog, package_sha256
 from crunchyroll_extractor.dex_extractor import DexExtractor
+from crunchyroll_extractor.dex_index import grep
+from crunchyroll_extractor.history import load_history, record_location, save_history
 from crunchyroll_extractor.credential_validator import CredentialValidator
+from crunchyroll_extractor.metrics import Metrics
+from crunchyroll_extractor.output import (
+    basic_auth,
+    latest_json,
+    location_class,
+    short_mobile_version,
+    user_agent_for,
+    version_string,
+    write_json,
+    write_mobile_credentials,
+    write_tv_credentials,
+)
+from crunchyroll_extractor.package_info import inspect_package, print_inspection
+from crunchyroll_extractor.profiling import profile_call
+from crunchyroll_extractor.sharding import (
+    ShardResults,
+    default_results_path,
+    merge_results,
+    parse_shard,
+    print_report,
+    select_shard,
+)
 
 
 
-def _short_mobile_version(version: str) -> str:
-    """Strip trailing build segment from 4-part version (e.g. 3.91.1.960 → 3.91.1)."""
-    if not version:
-        return version
-    parts = version.split('.')
-    if len(parts) > 3 and all(p.isdigit() for p in parts):
-        return '.'.join(parts[:-1])
-    return version
-
+def load_previous_result(path: str) -> PreviousResult:
+    """Read a latest-mobile.json / latest-tv.json written by an earlier run.
 
-def _write_json(path: str, data: dict) -> None:
-    with open(path, 'w', encoding='utf-8') as fh:
-        json.dump(data, fh, indent=2)
+    Raises ValueError if the file has no usable 'auth' field.
+    """
+    with open(path, encoding='utf-8') as fh:
+        data = json.load(fh)
+    try:
+        auth = base64.b64decode(data['auth']).decode()
+        client_id, secret_id = auth.split(':', 1)
+    except (KeyError, TypeError, ValueError) as e:
+        raise ValueError(f"{path} has no valid 'auth' field") from e
+    return PreviousResult(client_id, secret_id, data.get('source-class'))
 
 
 class CrunchyrollAnalyzer:
 
-    def __init__(self) -> None:
+    def __init__(
+        self,
+        pipeline_depth: int = DEX_PIPELINE_DEPTH,
+        metrics: Metrics | None = None,
+        workers: int = SCAN_WORKERS,
+        top_k: int = MOBILE_TOP_K,
+        catalog: Catalog | None = None,
+        history: str | None = None,
+    ) -> None:
+        self.pipeline_depth = pipeline_depth
+        self.catalog = catalog
+        self.history_path = history
+        self.history = load_history(history) if history else {}
+        self.time_budget: float | None = PACKAGE_TIME_BUDGET_S
+        self.memory_budget: int | None = PACKAGE_MEMORY_BUDGET_BYTES
+        self.metrics = metrics if metrics is not None else Metrics()
         self.validator = CredentialValidator()
-        self.extractor = DexExtractor(verbose=True)
+        self.extractor = DexExtractor(verbose=True, metrics=self.metrics, workers=workers, top_k=top_k)
+        self.timings: dict[str, float] = {}
+        self.last_result: dict | None = None
+        self.last_error: dict | None = None
 
     # ── output helpers ───────────────────────────────────────────────────────
 
@@ -56,31 +104,19 @@ class CrunchyrollAnalyzer:
         app_version: str,
         file_size: str,
         validation: dict,
+        source_class: str | None = None,
     ) -> None:
-        auth_str   = f"{client_id}:{secret_id}"
-        b64_auth   = base64.b64encode(auth_str.encode()).decode()
-        user_agent = USER_AGENT_TEMPLATE.format(app_version)
+        b64_auth   = basic_auth(client_id, secret_id)
+        user_agent = user_agent_for('mobile', app_version)
 
         json_path = os.path.join(PROJECT_ROOT, OUTPUT_JSON_FILENAME_MOBILE)
-        _write_json(json_path, {
-            'auth': b64_auth,
-            'user-agent': user_agent,
-            'app-version': app_version,
-        })
-
-        creds_path = os.path.join(PROJECT_ROOT, f"crunchyroll_credentials_mobile_v{app_version}.txt")
-        with open(creds_path, 'w', encoding='utf-8') as fh:
-            fh.write(f"Crunchyroll Version: {app_version}\n")
-            fh.write(f"File Size: {file_size}\n")
-            fh.write(f"Client ID: {client_id}\n")
-            fh.write(f"Secret ID: {secret_id}\n")
-            fh.write(f"Basic Auth: {b64_auth}\n")
-            fh.write(f"User-Agent: {user_agent}\n")
-            fh.write(f"Validation Status: {'VALID' if validation['valid'] else 'INVALID'}\n")
-            fh.write(f"Tested At: {time.strftime('%Y-%m-%d %H:%M:%S', time.localtime())}\n")
+        if self.catalog is None:
+            write_json(json_path, latest_json(b64_auth, user_agent, app_version, source_class))
+        creds_path = write_mobile_credentials(PROJECT_ROOT, client_id, secret_id, app_version, file_size,
+                                              validation)
 
         print(f"\n=== PHASE 3: OUTPUT ===")
-        print(f"Output JSON : {json_path}")
+        print(f"Output JSON : {json_path}{' (from catalog)' if self.catalog is not None else ''}")
         print(f"Credentials : {creds_path}")
         print(f"Basic Auth  : {b64_auth}")
         print(f"User-Agent  : {user_agent}")
@@ -93,197 +129,521 @@ class CrunchyrollAnalyzer:
         version_name: str,
         version_code: str,
         validation: dict,
+        source_class: str | None = None,
     ) -> None:
-        tv_version = f"{version_name}_{version_code}"
-        auth_str   = f"{client_id}:{secret_id}"
-        b64_auth   = base64.b64encode(auth_str.encode()).decode()
-        user_agent = TV_USER_AGENT_TEMPLATE.format(tv_version)
+        tv_version = version_string('tv', version_name, version_code)
+        b64_auth   = basic_auth(client_id, secret_id)
+        user_agent = user_agent_for('tv', tv_version)
 
         json_path = os.path.join(PROJECT_ROOT, OUTPUT_JSON_FILENAME_TV)
-        _write_json(json_path, {
-            'auth': b64_auth,
-            'user-agent': user_agent,
-            'app-version': tv_version,
-        })
-
-        creds_path = os.path.join(PROJECT_ROOT, f"crunchyroll_credentials_tv_v{tv_version}.txt")
-        with open(creds_path, 'w', encoding='utf-8') as fh:
-            fh.write(f"Crunchyroll TV Version: {tv_version}\n")
-            fh.write(f"Client ID: {client_id}\n")
-            fh.write(f"Secret ID: {secret_id}\n")
-            fh.write(f"Basic Auth: {b64_auth}\n")
-            fh.write(f"User-Agent: {user_agent}\n")
-            fh.write(f"CF_BM Cookie: {validation.get('cf_bm') or 'None'}\n")
-            fh.write(f"Anonymous Access Token Present: {validation.get('anonymous_access_token_present')}\n")
-            fh.write(f"User Code: {validation.get('user_code') or 'None'}\n")
-            fh.write(f"Device Code: {validation.get('device_code') or 'None'}\n")
-            fh.write(f"Validation Status: {'VALID' if validation['valid'] else 'INVALID'}\n")
-            fh.write(f"Tested At: {time.strftime('%Y-%m-%d %H:%M:%S', time.localtime())}\n")
+        if self.catalog is None:
+            write_json(json_path, latest_json(b64_auth, user_agent, tv_version, source_class))
+        creds_path = write_tv_credentials(PROJECT_ROOT, client_id, secret_id, tv_version, validation)
 
         print(f"\n=== PHASE 3: OUTPUT ===")
-        print(f"Output JSON : {json_path}")
+        print(f"Output JSON : {json_path}{' (from catalog)' if self.catalog is not None else ''}")
         print(f"Credentials : {creds_path}")
         print(f"Basic Auth  : {b64_auth}")
         print(f"User-Agent  : {user_agent}")
         print(f"TV Version  : {tv_version}")
 
+    # ── catalog ──────────────────────────────────────────────────────────────
+
+    def _record_run(self, package_path: str, validation: dict, source_class: str | None) -> None:
+        r = self.last_result
+        app_version = version_string(r['mode'], r['version_name'], r['version_code'])
+        self.catalog.record(
+            package=package_path if isinstance(package_path, str) else '<stream>',
+            package_sha256=package_sha256(package_path),
+            mode=r['mode'],
+            version_name=r['version_name'],
+            version_code=r['version_code'],
+            app_version=app_version,
+            client_id=r['client_id'],
+            secret_id=r['secret_id'],
+            auth=basic_auth(r['client_id'], r['secret_id']),
+            user_agent=user_agent_for(r['mode'], app_version),
+            source_class=source_class,
+            valid=None if validation.get('skipped') else validation.get('valid', False),
+            timings=self.timings,
+        )
+
+    def flush_catalog(self) -> None:
+        """Commit queued catalog rows and regenerate latest-*.json from the catalog."""
+        if self.catalog is None:
+            return
+        self.catalog.flush()
+        for mode, filename in (('mobile', OUTPUT_JSON_FILENAME_MOBILE), ('tv', OUTPUT_JSON_FILENAME_TV)):
+            row = self.catalog.latest(mode)
+            if row is not None:
+                write_json(os.path.join(PROJECT_ROOT, filename),
+                           latest_json(row['auth'], row['user_agent'], row['app_version'], row['source_class']))
+
+    # ── scan history ─────────────────────────────────────────────────────────
+
+    def _remember_location(self, mode: str, version_name: str) -> None:
+        """Store where this mode's credentials were found, to probe there first next time.
+
+        Called only for validated credentials that came from a full scan, so a
+        --compare or history hit (or a rejected pair) never becomes the location
+        every later probe is checked against.
+        """
+        location = self.extractor.last_location
+        if self.history_path is None or location is None:
+            return
+        best = self.extractor.last_candidates[0] if mode == 'mobile' and self.extractor.last_candidates else None
+        record_location(self.history, mode, location,
+                        hits=best.hits if best else 0,
+                        neighborhood=best.targets if best else (),
+                        version_name=version_name)
+        save_history(self.history_path, self.history)
+
     # ── main entry point ─────────────────────────────────────────────────────
 
-    def run(self, package_path: str, *, mode: str = 'auto') -> bool:
-        """Run the full extraction pipeline. mode: 'auto' | 'tv' | 'mobile'."""
+    def run(
+        self,
+        package_path: str,
+        *,
+        mode: str = 'auto',
+        validate: bool = True,
+        emit: bool = True,
+        previous: PreviousResult | None = None,
+    ) -> bool:
+        """Run the full extraction pipeline. mode: 'auto' | 'tv' | 'mobile'.
+
+        With validate=False the network check is skipped and the run succeeds as
+        soon as credentials are extracted; emit=False skips the output files.
+        With a previous result that records its source class, the scan first
+        checks whether that class still loads the same credentials and only
+        falls back to full extraction if it does not.
+        Per-phase wall times are left in self.timings and the extracted values
+        in self.last_result; both are also recorded in self.metrics. A corrupt
+        package or one over its time/memory budget fails with the structured
+        error in self.last_error.
+        """
+        ok = False
+        self.last_error = None
+        try:
+            ok = self._run(package_path, mode=mode, validate=validate, emit=emit, previous=previous)
+            return ok
+        finally:
+            self.metrics.inc('packages_processed_total', result='ok' if ok else 'failed')
+            for phase, seconds in self.timings.items():
+                self.metrics.observe('phase_duration_seconds', seconds, phase=phase)
+
+    def _run(
+        self,
+        package_path: str,
+        *,
+        mode: str,
+        validate: bool,
+        emit: bool,
+        previous: PreviousResult | None,
+    ) -> bool:
         print("=== CRUNCHYROLL CREDENTIAL EXTRACTOR (no-decompile) ===")
         print(f"Package : {package_path}")
         print("=" * 55)
 
         t_start = time.time()
-
-        print("\n=== PHASE 1: LOADING PACKAGE ===")
-        contents = load_package(package_path)
-        if contents is None:
+        self.timings = {}
+        self.last_result = None
+
+        # load, manifest, compare/history probe and scan: the same core as the library API
+        result = extract(package_path, mode=mode, time_budget=self.time_budget, memory_budget=self.memory_budget,
+                         extractor=self.extractor, pipeline_depth=self.pipeline_depth, plan=True,
+                         previous=previous, history=self.history, log=print)
+        self.timings.update(result.timings)
+        self.metrics.inc('bytes_inflated_total', result.inflated_bytes)
+        self.last_error = result.error
+        if result.error and result.error['kind'] == 'unreadable':
             print("ERROR: Failed to load package.")
             return False
-        print(f"Loaded {contents.apk_name} ({contents.file_size_str})")
-        print(f"  DEX files : {len(contents.dex_files)}")
-
-        print("\n=== PHASE 2: PARSING MANIFEST ===")
-        manifest = parse_manifest(contents.manifest_data)
-        version_name = manifest['versionName'] or 'unknown'
-        version_code = manifest['versionCode'] or '0'
-        detected_tv  = manifest['is_tv']
-        print(f"  versionName : {version_name}")
-        print(f"  versionCode : {version_code}")
-        print(f"  Android TV  : {detected_tv}")
-
-        if mode == 'auto':
-            resolved = 'tv' if detected_tv else 'mobile'
-            print(f"  [AUTO] resolved mode → {resolved.upper()}")
-        else:
-            resolved = mode
-
-        if resolved == 'tv':
-            client_id, secret_id = self.extractor.find_tv_credentials(contents.dex_files)
-        else:
-            client_id, secret_id = self.extractor.find_mobile_credentials(contents.dex_files)
-
-        # TV fallback: if mobile scan found nothing and manifest says TV, try TV extractor
-        if not (client_id and secret_id) and resolved == 'mobile' and detected_tv:
-            print("\n[Fallback] Mobile scan found nothing; manifest indicates TV. Trying TV extractor…")
-            client_id, secret_id = self.extractor.find_tv_credentials(contents.dex_files)
-            if client_id and secret_id:
-                resolved = 'tv'
-
-        if not (client_id and secret_id):
+        if result.error:
+            # malformed input or budget overrun: fail this package fast, keep the batch going
+            print(f"\nERROR: {describe_error(result.error)}")
+            return False
+        if not result.ok:
             print("\nERROR: Credentials not found.")
             return False
 
-        if resolved == 'tv':
-            tv_version = f"{version_name}_{version_code}"
-            user_agent = TV_USER_AGENT_TEMPLATE.format(tv_version)
+        resolved, client_id, secret_id = result.mode, result.client_id, result.secret_id
+        version_name, version_code = result.version_name, result.version_code
+        self.last_result = {
+            'mode': resolved,
+            'client_id': client_id,
+            'secret_id': secret_id,
+            'version_name': version_name,
+            'version_code': version_code,
+            'location': result.location,
+            'candidates': result.candidates,
+            'changed': None if previous is None else (
+                (client_id, secret_id) != (previous.client_id, previous.secret_id)),
+        }
+        source_class = location_class(result.location)
+
+        t_phase = time.perf_counter()
+        if not validate:
+            print("\n=== PHASE 4: VALIDATION SKIPPED ===")
+            validation = {'valid': False, 'skipped': True, 'error_reason': 'Validation skipped'}
+        elif resolved == 'tv':
+            user_agent = user_agent_for('tv', version_string('tv', version_name, version_code))
             print(f"\n=== PHASE 4: VALIDATING TV CREDENTIALS ===")
             validation = self.validator.validate_tv_credentials(client_id, secret_id, user_agent)
         else:
-            app_version = _short_mobile_version(version_name)
-            auth_str    = f"{client_id}:{secret_id}"
-            b64_auth    = base64.b64encode(auth_str.encode()).decode()
-            user_agent  = USER_AGENT_TEMPLATE.format(app_version)
+            b64_auth    = basic_auth(client_id, secret_id)
+            user_agent  = user_agent_for('mobile', short_mobile_version(version_name))
             print(f"\n=== PHASE 4: VALIDATING MOBILE CREDENTIALS ===")
             validation = self.validator.validate_credentials(b64_auth, user_agent, version_code)
+        self.timings['validate'] = time.perf_counter() - t_phase
 
         valid = validation.get('valid', False)
-
-        if resolved == 'tv':
-            self._emit_tv(client_id, secret_id, version_name, version_code, validation)
-        else:
-            app_version = _short_mobile_version(version_name)
-            self._emit_mobile(client_id, secret_id, app_version, contents.file_size_str, validation)
+        if valid and result.source == 'scan':
+            self._remember_location(resolved, version_name)
+
+        t_phase = time.perf_counter()
+        if emit and resolved == 'tv':
+            self._emit_tv(client_id, secret_id, version_name, version_code, validation, source_class)
+        elif emit:
+            self._emit_mobile(client_id, secret_id, short_mobile_version(version_name), result.file_size,
+                              validation, source_class)
+        self.timings['output'] = time.perf_counter() - t_phase
+        if emit and self.catalog is not None:
+            self._record_run(package_path, validation, source_class)
 
         elapsed = time.time() - t_start
         print("\n" + "=" * 55)
-        if valid:
+        if not validate:
+            print("=== EXTRACTION COMPLETE (validation skipped) ===")
+        elif valid:
             print("=== EXTRACTION AND VALIDATION SUCCESSFUL ===")
         else:
             print("=== EXTRACTION COMPLETE – VALIDATION FAILED ===")
             err = validation.get('error_reason', 'Unknown error')
             print(f"Reason: {err}")
+        if previous is not None:
+            changed = self.last_result['changed']
+            print(f"Credentials: {'CHANGED since' if changed else 'unchanged from'} previous result")
         print(f"Total time : {elapsed:.2f}s")
         print("=" * 55)
-        return valid
-
-
-
-def _parse_args(argv: list[str]) -> tuple[str | None, str, bool]:
-    """Return (package_path, mode, show_help)."""
+        return valid if validate else True
+
+
+@dataclass
+class _CliOptions:
+    paths: list[str] = field(default_factory=list)
+    mode: str = 'auto'
+    show_help: bool = False
+    profile: bool = False
+    metrics_file: str | None = None
+    workers: str | None = None
+    compare: str | None = None
+    top_k: str | None = None
+    catalog: str | None = None
+    shard: str | None = None
+    results: str | None = None
+    history: bool = False
+
+
+# Options that take a value: flag → _CliOptions attribute
+_VALUE_OPTIONS = {
+    '--metrics-file': 'metrics_file',
+    '--workers': 'workers',
+    '--compare': 'compare',
+    '--top-k': 'top_k',
+    '--catalog': 'catalog',
+    '--shard': 'shard',
+    '--results': 'results',
+}
+
+
+def _parse_args(argv: list[str]) -> _CliOptions:
+    """Parse the command line; every non-flag argument (or '-' for stdin) is a package path."""
+    opts = _CliOptions()
     args = [a for a in argv if a]
     if '-h' in args or '--help' in args:
-        return None, 'auto', True
-
-    explicit_tv     = '--tv'     in args
-    explicit_mobile = '--mobile' in args
-    if explicit_tv:
-        mode = 'tv'
-    elif explicit_mobile:
-        mode = 'mobile'
-    else:
-        mode = 'auto'
-
-    path: str | None = None
-    skip_next = False
-    for i, a in enumerate(args):
-        if skip_next:
-            skip_next = False
+        opts.show_help = True
+        return opts
+
+    if '--tv' in args:
+        opts.mode = 'tv'
+    elif '--mobile' in args:
+        opts.mode = 'mobile'
+
+    i = 0
+    while i < len(args):
+        a = args[i]
+        if a in _VALUE_OPTIONS:
+            if i + 1 >= len(args):
+                raise ValueError(f"{a} requires a value")
+            setattr(opts, _VALUE_OPTIONS[a], args[i + 1])
+            i += 2
+            continue
+        if a == '--profile':
+            opts.profile = True
+        elif a == '--history':
+            opts.history = True
+        elif a == '-' or not a.startswith('-'):
+            opts.paths.append(a)
+        i += 1
+    return opts
+
+
+def _print_help() -> None:
+    print("Usage: python main.py [--tv|--mobile] [options] [path ...] [-h|--help]")
+    print()
+    print("Options:")
+    print("  --tv [path]           Force Android TV mode.")
+    print("  --mobile              Force Android Mobile mode.")
+    print("  path ...              Local APK/XAPK/APKM/APKS/ZIP path(s); several paths run as a batch.")
+    print("                        '-' reads one package from stdin (type detected from its contents).")
+    print("  --metrics-file FILE   Write Prometheus textfile metrics after each package.")
+    print("  --profile             Profile each run; writes profile_<package>.pstats/.collapsed.")
+    print("  --workers N           Scan large DEX files with N worker processes (default: planner).")
+    print("  --top-k N             Keep and print the N best mobile candidates with their locations.")
+    print("  --catalog FILE        Record runs in a SQLite catalog; latest-*.json is generated from it.")
+    print("  --compare FILE        Reuse a previous latest-*.json if its credentials are unchanged.")
+    print("  --history             Probe the last validated location first; skip the full scan if confirmed.")
+    print("  --shard i/N           Process only the packages whose name hashes to shard i of N.")
+    print("  --results FILE        Write per-package results and timings as JSON")
+    print("                        (default with --shard: results-shard-<i>-of-<N>.json).")
+    print("  -h, --help            Show this help and exit.")
+    print()
+    print("Subcommands:")
+    print("  grep PATTERN PATH     Search DEX strings and their xrefs (see: main.py grep --help).")
+    print("  inspect PATH ...      Show manifest fields and per-DEX counts without scanning.")
+    print("  merge FILE ...        Combine --shard result files into one report (see: main.py merge --help).")
+    print()
+    print("No APKTool required. Credentials are extracted directly from DEX files.")
+
+
+def _select_package() -> str | None:
+    print("Select the APK/XAPK/APKM package…")
+    chosen: str | None = None
+    try:
+        if tk is not None:
+            root = tk.Tk()
+            root.withdraw()
+            chosen = filedialog.askopenfilename(
+                title="Select APK/XAPK/APKM/APKS package",
+                filetypes=[
+                    ("APK or Bundles", "*.apk *.xapk *.apkm *.apks *.zip"),
+                    ("All files", "*.*"),
+                ],
+            )
+            root.destroy()
+    except Exception as e:
+        print(f"File dialog failed: {e}")
+    return chosen or None
+
+
+def _grep_main(argv: list[str]) -> None:
+    """python main.py grep [--regex] [--rebuild] [--limit N] PATTERN PATH"""
+    regex = '--regex' in argv
+    rebuild = '--rebuild' in argv
+    limit = 50
+    positional: list[str] = []
+    i = 0
+    while i < len(argv):
+        a = argv[i]
+        if a == '--limit' and i + 1 < len(argv) and argv[i + 1].isdigit():
+            limit = int(argv[i + 1])
+            i += 2
             continue
-        if a in ('--tv', '--mobile', '--no-clean', '-h', '--help'):
-            if a in ('--tv', '--mobile') and i + 1 < len(args) and not args[i + 1].startswith('-') and path is None:
-                path = args[i + 1]
-                skip_next = True
+        if a in ('-h', '--help'):
+            positional = []
+            break
+        if not a.startswith('--'):
+            positional.append(a)
+        i += 1
+
+    if len(positional) != 2:
+        print("Usage: python main.py grep [--regex] [--rebuild] [--limit N] PATTERN PATH")
+        print()
+        print("Search the DEX string pools of a package and list the methods referencing each match.")
+        print("  --regex       Treat PATTERN as a regular expression (default: substring).")
+        print("  --rebuild     Rebuild the cached index for PATH.")
+        print("  --limit N     Show at most N matching strings (default 50).")
+        sys.exit(0 if argv and argv[0] in ('-h', '--help') else 1)
+
+    pattern, path = positional
+    found = grep(path, pattern, regex=regex, rebuild=rebuild, limit=limit)
+    sys.exit(0 if found else 1)
+
+
+def _merge_main(argv: list[str]) -> None:
+    """python main.py merge [--out FILE] RESULTS ..."""
+    out = None
+    files: list[str] = []
+    i = 0
+    while i < len(argv):
+        a = argv[i]
+        if a == '--out' and i + 1 < len(argv):
+            out = argv[i + 1]
+            i += 2
             continue
-        if not a.startswith('-') and path is None:
-            path = a
+        if a in ('-h', '--help'):
+            files = []
+            break
+        if not a.startswith('--'):
+            files.append(a)
+        i += 1
+
+    if not files:
+        print("Usage: python main.py merge [--out FILE] RESULTS ...")
+        print()
+        print("Combine the result files written by --shard runs into one report ordered by package.")
+        print("  --out FILE    Also write the merged report as JSON.")
+        sys.exit(0 if argv and argv[0] in ('-h', '--help') else 1)
+
+    try:
+        report = merge_results(files)
+    except (OSError, ValueError, KeyError) as e:
+        print(f"ERROR: Cannot merge results: {e}")
+        sys.exit(1)
+    print_report(report)
+    if out:
+        write_json(out, report)
+        print(f"\nMerged report written to {out}")
+    summary = report['summary']
+    sys.exit(0 if summary['succeeded'] == summary['packages'] and not report['warnings'] else 1)
+
+
+def _inspect_main(argv: list[str]) -> None:
+    """python main.py inspect [--json] PATH ..."""
+    as_json = '--json' in argv
+    paths = [a for a in argv if not a.startswith('-')]
+    if not paths or '-h' in argv or '--help' in argv:
+        print("Usage: python main.py inspect [--json] PATH ...")
+        print()
+        print("Report manifest fields and per-DEX header/map_list counts from ZIP metadata alone.")
+        print("  --json        Print one JSON object per package instead of a table.")
+        sys.exit(0 if '-h' in argv or '--help' in argv else 1)
+
+    failed = 0
+    for path in paths:
+        info = inspect_package(path) if os.path.exists(path) else None
+        if info is None:
+            print(f"ERROR: Cannot inspect {path}")
+            failed += 1
+        elif as_json:
+            print(json.dumps({**info._asdict(), 'dex': [d._asdict() for d in info.dex]}))
+        else:
+            print_inspection(info)
+    sys.exit(1 if failed else 0)
+
 
-    return path, mode, False
+def _result_record(analyzer: CrunchyrollAnalyzer, path: str, ok: bool) -> dict:
+    """One package's entry in a --results file: keyed by path, with the file name as its label."""
+    return {
+        'package': 'stdin' if path == '-' else os.path.basename(os.path.normpath(path)),
+        'path': path,
+        'ok': ok,
+        'total': round(sum(analyzer.timings.values()), 6),
+        'timings': {k: round(v, 6) for k, v in analyzer.timings.items()},
+        'error': analyzer.last_error,
+        **(analyzer.last_result or {}),
+    }
 
 
 def main() -> None:
-    package_path, mode, show_help = _parse_args(sys.argv[1:])
+    if sys.argv[1:2] == ['grep']:
+        _grep_main(sys.argv[2:])
+        return
+    if sys.argv[1:2] == ['inspect']:
+        _inspect_main(sys.argv[2:])
+        return
+    if sys.argv[1:2] == ['merge']:
+        _merge_main(sys.argv[2:])
+        return
 
-    if show_help:
-        print("Usage: python main.py [--tv|--mobile] [path] [-h|--help]")
-        print()
-        print("Options:")
-        print("  --tv [path]    Force Android TV mode.")
-        print("  --mobile       Force Android Mobile mode.")
-        print("  path           Local APK/XAPK/APKM/APKS/ZIP path.")
-        print("  -h, --help     Show this help and exit.")
-        print()
-        print("No APKTool required. Credentials are extracted directly from DEX files.")
+    try:
+        opts = _parse_args(sys.argv[1:])
+    except ValueError as e:
+        print(f"ERROR: {e}. Use --help for usage.")
+        sys.exit(1)
+
+    if opts.show_help:
+        _print_help()
         return
 
-    if not package_path:
-        print("Select the APK/XAPK/APKM package…")
-        chosen: str | None = None
-        try:
-            if tk is not None:
-                root = tk.Tk()
-                root.withdraw()
-                chosen = filedialog.askopenfilename(
-                    title="Select APK/XAPK/APKM/APKS package",
-                    filetypes=[
-                        ("APK or Bundles", "*.apk *.xapk *.apkm *.apks *.zip"),
-                        ("All files", "*.*"),
-                    ],
-                )
-                root.destroy()
-        except Exception as e:
-            print(f"File dialog failed: {e}")
-        package_path = chosen or None
-
-    if not package_path:
+    paths = opts.paths
+    if not paths:
+        chosen = _select_package()
+        paths = [chosen] if chosen else []
+
+    if not paths:
         print("ERROR: No package provided. Use --help for usage.")
         sys.exit(1)
 
-    analyzer = CrunchyrollAnalyzer()
-    ok = analyzer.run(package_path, mode=mode)
-    sys.exit(0 if ok else 1)
+    try:
+        workers = int(opts.workers) if opts.workers else SCAN_WORKERS
+    except ValueError:
+        print(f"ERROR: --workers expects an integer, got {opts.workers!r}.")
+        sys.exit(1)
+
+    try:
+        top_k = int(opts.top_k) if opts.top_k else MOBILE_TOP_K
+    except ValueError:
+        print(f"ERROR: --top-k expects an integer, got {opts.top_k!r}.")
+        sys.exit(1)
+
+    previous = None
+    if opts.compare:
+        try:
+            previous = load_previous_result(opts.compare)
+        except (OSError, ValueError) as e:
+            print(f"ERROR: Cannot read previous result: {e}")
+            sys.exit(1)
+        if not previous.source_class:
+            print(f"[compare] {opts.compare} does not record a source class; a full scan will run.")
+
+    results = None
+    if opts.shard:
+        try:
+            shard, n_shards = parse_shard(opts.shard)
+        except ValueError as e:
+            print(f"ERROR: {e}.")
+            sys.exit(1)
+        if '-' in paths:
+            print("ERROR: --shard cannot be combined with stdin input.")
+            sys.exit(1)
+        total = len(paths)
+        paths = select_shard(paths, shard, n_shards)
+        print(f"[shard] {shard}/{n_shards}: {len(paths)} of {total} package(s)")
+        results = ShardResults(opts.results or default_results_path(PROJECT_ROOT, shard, n_shards),
+                               shard, n_shards, len(paths))
+    elif opts.results:
+        results = ShardResults(opts.results, 1, 1, len(paths))
+
+    catalog = Catalog(opts.catalog, batch_size=CATALOG_BATCH_SIZE) if opts.catalog else None
+    analyzer = CrunchyrollAnalyzer(workers=workers, top_k=top_k, catalog=catalog,
+                                   history=SCAN_HISTORY_FILE if opts.history else None)
+    failed = 0
+    for path in paths:
+        if opts.profile:
+            label = 'stdin' if path == '-' else os.path.basename(os.path.normpath(path))
+            prefix = os.path.join(PROJECT_ROOT, f"profile_{label}")
+            ok = profile_call(analyzer.run, path, mode=opts.mode, previous=previous, out_prefix=prefix)
+        else:
+            ok = analyzer.run(path, mode=opts.mode, previous=previous)
+        if not ok:
+            failed += 1
+        if results is not None:
+            results.add(_result_record(analyzer, path, ok))
+        if opts.metrics_file:
+            analyzer.metrics.write_textfile(opts.metrics_file)
+
+    analyzer.extractor.close()
+    if catalog is not None:
+        analyzer.flush_catalog()
+        catalog.close()
+    if results is not None:
+        results.finish()
+        print(f"[shard] Results written to {results.path}")
+
+    if len(paths) > 1:
+        print(f"\nBatch: {len(paths) - failed}/{len(paths)} package(s) succeeded.")
+    sys.exit(0 if not failed else 1)
 
 
 if __name__ == "__main__":